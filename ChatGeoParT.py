@@ -1,21 +1,49 @@
 import os
+import math
 import streamlit as st
 import reveal_slides as rs
 from code_editor import code_editor
+from game_library import GameLibrary
+from game_format import GameFormatError
+from question_index import QuestionIndex
 
 if 'markdown' not in st.session_state:
     st.session_state.markdown = ""
 
+games_per_page = 50
+
+@st.cache_resource
+def get_game_library():
+    """Returns the process-wide index of the games directory; the games' clues go into the question index once repeats are checked."""
+    return GameLibrary(os.path.join(os.getcwd(), "games"), question_index=QuestionIndex(os.path.join(os.getcwd(), "question_index.sqlite3")))
+
+game_library = get_game_library()
 with st.sidebar:
-    list_of_games_in_dir = []
-    for file in os.listdir(os.getcwd() + "/games"):
-        if file.endswith(".md"):
-            list_of_games_in_dir.append(file.removesuffix(".md"))
+    search = st.text_input("Search games", placeholder="Title or category")
+    list_of_games_in_dir = game_library.search(search)
+    # Only one page of games goes into the selectbox, however large the library is
+    games_on_page = list_of_games_in_dir
+    if len(list_of_games_in_dir) > games_per_page:
+        number_of_pages = math.ceil(len(list_of_games_in_dir)/games_per_page)
+        page = st.number_input(f"Page (of {number_of_pages})", min_value=1, max_value=number_of_pages, step=1, value=1)
+        games_on_page = list_of_games_in_dir[(page - 1)*games_per_page:page*games_per_page]
 
-    option = st.selectbox("Select a game", list_of_games_in_dir)
+    option = st.selectbox("Select a game", games_on_page, format_func=game_library.title)
+    if option and game_library.categories(option):
+        st.caption(", ".join(game_library.categories(option)))
+    if option and st.toggle("Check for clues used in other games"):
+        try:
+            repeats = game_library.repeats(option)
+        except GameFormatError:
+            repeats = []
+        st.caption(f"Clues also in other games: {len(repeats)}")
+        for question, answer, match in repeats:
+            st.caption(f"{question} / {answer}: {100*match['similarity']:.0f}% like {game_library.title(os.path.basename(match['source']))}")
 if option:
-    with open("games/" + option + ".md", "r") as f:
-        st.session_state.markdown = f.read()
+    try:
+        st.session_state.markdown = game_library.read_game(option)
+    except GameFormatError as e:
+        st.error(f"Can't load {option}: {e}")
 
 btn_settings_editor_btns = [{
                                 "name": "copy",
@@ -1,22 +1,71 @@
+import time
+script_start = time.perf_counter()
+
 import os
 import sys
-import time
 import uuid
+import functools
 import math
-import openai
-import tiktoken
 import streamlit as st
-import reveal_slides as rs
 import streamlit_tags as stt
 
-from io import BytesIO
-from zipfile import ZipFile
-from code_editor import code_editor
+from lazy_imports import lazy_module, import_timings
+from client_pool import ClientRegistry
+from rate_limiter import TokenBucketLimiter
+from retry_policy import RetryPolicy
+from prompt_context import PromptContext
+from response_cache import ResponseCache
+from single_flight import SingleFlight
+from question_bank import QuestionBank
+from question_index import QuestionIndex
+from telemetry import Telemetry, default_log_path, default_startup_log_path, default_model, context_limit, log_startup
+from generation_jobs import JobManager, JobQueueFullError, generate_board, queued, running
+from trivia_generator import is_complete
+from game_format import GameFormatError, make_game, dumps_game, loads_game, render_game, patch_game
+from board_slides import cell_at_slide
+from game_export import GameExport
+from session_store import BlobStore, SessionBlobs
+from profiler import Profiler
+
+# Only needed once there are slides to show or edit, and openai only once generating
+rs = lazy_module("reveal_slides")
+code_editor_component = lazy_module("code_editor")
+import_seconds = time.perf_counter() - script_start
 
 num_intro_slides = 3
-
-if 'markdown' not in st.session_state:
-    st.session_state.markdown = ""
+player_file_names = ['ChatGeoParT.py', 'game_library.py', 'game_format.py', 'board_slides.py', 'question_index.py']
+
+@st.cache_resource
+def get_player_files():
+    """Returns the bundled player app's modules, read from disk once per process."""
+    player_files = {}
+    for file_name in player_file_names:
+        with open(file_name, 'r') as f:
+            player_files[file_name] = f.read()
+    return player_files
+
+@st.cache_resource
+def get_startup_timings():
+    """Returns the timings of this process's first page load, filled in at the end of the first run."""
+    return {"imports": import_seconds, "first_page": None}
+
+@st.cache_resource
+def get_blob_store():
+    """Returns the store holding every session's slides, CSS and answers once per distinct content."""
+    return BlobStore()
+
+@st.cache_resource
+def get_profiler():
+    """Returns the timings of every rerun's sections and API requests, aggregated over all sessions of this process."""
+    return Profiler()
+
+# Each section of the script is timed until the next one starts; a run that reaches the end is also timed as a whole
+rerun_timer = get_profiler().rerun()
+rerun_timer.section("session_state")
+# Large strings (slides, CSS, answers) live in the shared blob store; sessions only keep their digests
+if 'blobs' not in st.session_state:
+    st.session_state.blobs = SessionBlobs(get_blob_store())
+session_blobs = st.session_state.blobs
 if 'reveal' not in st.session_state:
     st.session_state.reveal = "new-start"
 if 'tokens' not in st.session_state:
@@ -25,226 +74,153 @@ if 'delta' not in st.session_state:
     st.session_state.delta = 0
 if 'lastdelta' not in st.session_state:
     st.session_state.lastdelta = 0
-if 'answerfiletxt' not in st.session_state:
-    st.session_state.answerfiletxt = ""
+if 'cache_hits' not in st.session_state:
+    st.session_state.cache_hits = 0
+if 'cache_misses' not in st.session_state:
+    st.session_state.cache_misses = 0
+if 'shared_requests' not in st.session_state:
+    st.session_state.shared_requests = 0
+if 'repeated_rows' not in st.session_state:
+    st.session_state.repeated_rows = 0
+if 'telemetry' not in st.session_state:
+    st.session_state.telemetry = Telemetry()
+if 'lastcost' not in st.session_state:
+    st.session_state.lastcost = 0.0
+if 'game' not in st.session_state:
+    st.session_state.game = None
+if 'loaded_game_file' not in st.session_state:
+    st.session_state.loaded_game_file = None
+if 'open_cells' not in st.session_state:
+    st.session_state.open_cells = []
+if 'generation_job' not in st.session_state:
+    st.session_state.generation_job = st.query_params.get("job")
+if 'collected_job' not in st.session_state:
+    st.session_state.collected_job = None
+if 'game_export' not in st.session_state:
+    st.session_state.game_export = GameExport(get_player_files())
 
 ## OpenAI API Credentials setup ====================================================
 
 # Openai local configuration
 
+@st.cache_resource
+def get_client_registry():
+    """Returns the process-wide registry of per-credential OpenAI clients."""
+    return ClientRegistry()
+
+rerun_timer.section("credentials")
+openai_client = None
 with st.sidebar:
     st.markdown("## Configuration")
     with st.expander("OpenAI API Credentials"):
         default_openai_key = ""
         default_openai_org = ""
-        if openai.api_key and openai.organization:
-            default_openai_key = openai.api_key
-            default_openai_org = openai.organization
+        # The same environment variables the openai module reads, without importing it
+        if os.environ.get("OPENAI_API_KEY") and os.environ.get("OPENAI_ORGANIZATION"):
+            default_openai_key = os.environ["OPENAI_API_KEY"]
+            default_openai_org = os.environ["OPENAI_ORGANIZATION"]
         openai_key = st.text_input("Key", type="password", value=default_openai_key)
         openai_org = st.text_input("Organization", type="password", value=default_openai_org)
         if openai_org and openai_key:
-            openai.organization = openai_org
-            openai.api_key = openai_key
-            try:
-                openai.Model.list()
+            openai_client = get_client_registry().get_client(openai_key, openai_org)
+            # Validation is cached per credentials, so reruns don't call the API again
+            credentials_valid = openai_client.validate()
+            if credentials_valid:
                 st.success("Success!! API credentials registered.")
-            except:
+            elif credentials_valid is None:
+                st.warning("Couldn't reach the OpenAI API to check the credentials, they'll be checked again when the page next updates.")
+            else:
                 st.error("Invalid API credentials!")
 
 if openai_key == "" or openai_org == "":
     st.warning(":arrow_left: Please provide an OpenAI API key and organization in the sidebar.")
 
 ## App setup ========================================================================
+rerun_timer.section("settings")
 with st.sidebar:
     with st.expander("Settings"):
-        request_delay = st.number_input("Delay between API requests to avoid rate limit (seconds)", min_value=0.0, max_value=5.0, value=1.0, step=0.1)
+        generation_mode = st.selectbox("Generation mode", ["One request per category", "Whole board in one request"])
+        concurrent_generation = st.checkbox("Generate categories concurrently", value=True)
+        progressive_generation = st.checkbox("Show questions as they are generated", value=True)
+        requests_per_minute = st.number_input("API request limit (requests/min)", min_value=1, max_value=10000, value=60, step=1)
+        tokens_per_minute = st.number_input("API token limit (tokens/min)", min_value=1000, max_value=1000000, value=90000, step=1000)
+        max_attempts = st.number_input("Attempts per API request before giving up", min_value=1, max_value=10, value=4, step=1)
+        history_window = st.number_input("Previous categories sent as context with each request", min_value=0, max_value=5, value=0, step=1)
+        use_question_bank = st.checkbox("Take categories from the question bank when available", value=True)
+        use_cache = st.checkbox("Reuse cached categories", value=True)
+        share_requests = st.checkbox("Share categories being generated for other players at the same time", value=True)
+        avoid_repeats = st.checkbox("Request new questions for any that repeat earlier games", value=True)
+        cache_variants = st.number_input("Cached or shared variants to pick from per category", min_value=1, max_value=5, value=1, step=1)
+        cache_ttl_hours = st.number_input("Cached categories expire after (hours)", min_value=1, max_value=24*30, value=24*7, step=1)
         multiplier = st.number_input("Multiplier to increase values on game board", min_value=1, max_value=8, value=1, step=1)
         question_timer = st.number_input("Time given to players to answer (seconds)", min_value=0, max_value=60, value=10, step=1)
+        lazy_slides = st.checkbox("Send question slides to the browser only when they're opened (reloads the slides for each question)", value=False)
+
+    with st.expander("Load a saved game"):
+        game_file = st.file_uploader("Game file (.json, or .md from older versions)", type=["json", "md"])
+        # Only load an upload once, so later edits to the slides aren't overwritten on every rerun
+        if game_file is not None and game_file.file_id != st.session_state.loaded_game_file:
+            game_file_text = game_file.getvalue().decode()
+            try:
+                if game_file.name.endswith(".json"):
+                    st.session_state.game = loads_game(game_file_text)
+                    slide_markdown, answerfiletxt = render_game(st.session_state.game)
+                    session_blobs.set("markdown", slide_markdown)
+                    session_blobs.set("answerfiletxt", answerfiletxt)
+                else:
+                    st.session_state.game = None
+                    session_blobs.set("markdown", game_file_text)
+                    session_blobs.set("answerfiletxt", "")
+                st.session_state.reveal = str(uuid.uuid4())
+                st.session_state.open_cells = []
+                st.session_state.loaded_game_file = game_file.file_id
+            except GameFormatError as e:
+                st.error(str(e))
 
 ## Functions ========================================================================
-def create_download_zip_file(markdown_file_string, css_file_string, answer_file_string, app_file_string):
-    """
-    returns: zip archive
-    """
-    archive = BytesIO()
-
-    with ZipFile(archive, 'w') as zip_archive:
-        # Create three files on zip archive
-        with zip_archive.open('ChatGeoParT/style.css', 'w') as file1:
-            file1.write(css_file_string.encode())
-        
-        with zip_archive.open('ChatGeoParT/games/game.md', 'w') as file2:
-            file2.write(markdown_file_string.encode())
-
-        with zip_archive.open('ChatGeoParT/games/answers.txt', 'w') as file3:
-            file3.write(answer_file_string.encode())
-
-        with zip_archive.open('ChatGeoParT/ChatGeoParT.py', 'w') as file4:
-            file4.write(app_file_string.encode())
-
-    return archive
-
-token_count_at_start = 0
-def num_tokens_from_string(string: str, encoding_name="cl100k_base") -> int:
-    """Returns the number of tokens in a text string."""
-    encoding = tiktoken.get_encoding(encoding_name)
-    num_tokens = len(encoding.encode(string))
-    return num_tokens
-
-messages=[
-          {"role": "system", "content": "You are a helpful trivia game creation assistant."}
-         ]
-def query_ai(message_text, model="gpt-3.5-turbo", temperature=0.7):
-    number_of_tokens = st.session_state.tokens + num_tokens_from_string(message_text)
-    messages.append({"role": "user", "content": message_text})
-    try:
-        output = openai.ChatCompletion.create(
-                    model=model,
-                    messages=messages,
-                    temperature=temperature,
-                    )
-    except openai.error.Timeout as e:
-        #Handle timeout error, e.g. retry or log
-        st.error(f"ERROR! OpenAI API request timed out: {e}")
-        pass
-    except openai.error.APIError as e:
-        #Handle API error, e.g. retry or log
-        st.error(f"ERROR! OpenAI API returned an API Error: {e}")
-        pass
-    except openai.error.APIConnectionError as e:
-        #Handle connection error, e.g. check network or log
-        st.error(f"ERROR! OpenAI API request failed to connect: {e}")
-        pass
-    except openai.error.InvalidRequestError as e:
-        #Handle invalid request error, e.g. validate parameters or log
-        st.error(f"ERROR! OpenAI API request was invalid: {e}")
-        pass
-    except openai.error.AuthenticationError as e:
-        #Handle authentication error, e.g. check credentials or log
-        st.error(f"ERROR! OpenAI API request was not authorized: {e}")
-        pass
-    except openai.error.PermissionError as e:
-        #Handle permission error, e.g. check scope or log
-        st.error(f"ERROR! OpenAI API request was not permitted: {e}")
-        pass
-    except openai.error.RateLimitError as e:
-        #Handle rate limit error, e.g. wait or log
-        st.error(f"ERROR! OpenAI API request exceeded rate limit. Please wait a few seconds and try again.")
-        pass
-    except Exception as e:
-        #Handle other exceptions, e.g. log
-        st.error(f"ERROR! OpenAI API request failed: {e}")
-        pass
-
-    if output.choices[0].message.content:
-        st.session_state.tokens = number_of_tokens + num_tokens_from_string(output.choices[0].message.content)
-        return output.choices[0].message.content
-    else:
-        return "Error: No response from AI."
-
-def get_jeopardy_trivia(category):
-    response = query_ai("The Jeopardy category is '" + category + "' and the dollar amounts under this category are '$200', '$400', '$600', '$800', '$1000' in order of increasing difficulty. Generate a jeopardy style question + answer for each dollar amount in the category. Provide a list of the questions each with their corresponding answer in the format '- dollar amount | Question : Answer\n'.")
-
-    trivia_questions = [[0],[0],[0],[0],[0]]
-    if response:
-        lines = response.split("\n")
-        for line in lines:
-            if line.startswith("$") or line.startswith("-"):
-                row = line.split("|")
-                if len(row) == 2:
-                    qa = row[1].replace("Question:", "").replace("question:", "").replace("q:", "").replace("Q:", "").split(":")
-                    if len(qa) == 2:
-                        amount = row[0].replace("$", "").replace("-", "")
-                        question = qa[0].replace("answer", "").replace("Answer", "").strip()
-                        answer = qa[1].replace("answer", "").replace("Answer", "").strip()
-                        if "200" in amount:
-                            trivia_questions[0] = format_qa_response([question, answer])
-                        elif "400" in amount:
-                            trivia_questions[1] = format_qa_response([question, answer])
-                        elif "600" in amount:
-                            trivia_questions[2] = format_qa_response([question, answer])
-                        elif "800" in amount:
-                            trivia_questions[3] = format_qa_response([question, answer])
-                        elif "1000" in amount:
-                            trivia_questions[4] = format_qa_response([question, answer])
-                
-    return trivia_questions
-
-def retry_get_jeopardy_trivia(category, number_of_tries=2):
-    trivia_questions = [[0],[0],[0],[0],[0]]
-    for i in range(number_of_tries):
-        time.sleep(request_delay)
-        trivia_questions = get_jeopardy_trivia(category)
-        check = True
-        for array in trivia_questions:
-            if len(array) < 2 or array[0] == 0:
-                check = False
-        if check:
-            return trivia_questions
-    return trivia_questions
-
-def format_qa_response(response):
-    question = response[0]
-    answer = response[1]
-    six_ws = ["who", "what", "when", "where", "why", "which"]
-    etre = ["is", "are", "was", "were"]
-    words_in_q = question.replace("-", "").replace(":", "").strip().split(" ")
-    ans_start = ""
-    if words_in_q[0].lower() in six_ws and words_in_q[1].lower() in etre:
-        question = question.replace(words_in_q[0], "", 1).replace(words_in_q[1], "", 1).replace(words_in_q[2], words_in_q[2].capitalize(), 1).strip()
-        ans_start = words_in_q[0].capitalize() + " " + words_in_q[1].lower() + " "
-    elif words_in_q[0].lower() in six_ws:
-        if words_in_q[0].lower() == "who":
-            question = question.replace(words_in_q[0], "This person", 1)
-            ans_start = "Who is "
-        elif words_in_q[0].lower() == "what":
-            question = question.replace(words_in_q[0], "This", 1)
-            ans_start = "What is "
-    words_in_a = answer.replace("-", "").replace(":", "").strip().split(" ")
-    if words_in_a[0].lower() not in six_ws:
-        answer = ans_start + answer.replace(words_in_a[0], words_in_a[0].lower(), 1).strip()
-    if question.strip().endswith("?"):
-        question = question.strip().rsplit("?", 1)[0]
-    answer = answer.strip()
-    if not answer.endswith("?"):
-        if answer.endswith("."):
-            answer = answer.rsplit(".", 1)[0]
-        answer = answer.strip() + "?"
-
-    return [question, answer.upper()]
+@st.cache_resource
+def get_rate_limiter(requests_per_minute, tokens_per_minute):
+    """Returns one limiter per configuration, shared by every session of this process."""
+    return TokenBucketLimiter(requests_per_minute, tokens_per_minute)
+
+@st.cache_resource
+def get_retry_policy(max_attempts):
+    """Returns one retry policy per setting, so every session shares its circuit breaker."""
+    return RetryPolicy(max_attempts=max_attempts)
+
+@st.cache_resource
+def get_response_cache(ttl_hours, variants):
+    """Returns the on-disk cache of category replies, shared by every session of this process."""
+    return ResponseCache(ttl_seconds=ttl_hours*3600, variants=variants)
+
+@st.cache_resource
+def get_single_flight(variants):
+    """Returns the process-wide table of in-flight category requests, so identical ones are made only once."""
+    return SingleFlight(variants=variants)
+
+@st.cache_resource
+def get_question_bank():
+    """Returns the local bank of pre-generated questions (see question_bank.py)."""
+    return QuestionBank()
+
+@st.cache_resource
+def get_question_index():
+    """Returns the local index of every board's questions, used to catch repeats (see question_index.py)."""
+    return QuestionIndex()
+
+@st.cache_resource
+def get_process_telemetry():
+    """Returns the telemetry shared by every session of this process, which also writes the JSONL log."""
+    return Telemetry(log_path=default_log_path)
+
+@st.cache_resource
+def get_job_manager():
+    """Returns the pool of background generation workers, shared by every session of this process."""
+    return JobManager(profiler=get_profiler(), telemetry=get_process_telemetry(), question_index=get_question_index())
 
 
 ## Main App ========================================================================
-slide_markdown = r"""<section data-markdown="" data-separator-vertical="^--$" data-separator-notes="^Answer:" >
-<script type="text/template">
-## [Welcome to Chat GeoParT!](#/1)"""
-
-slide_markdown_close = r"""
-</script>
-</section>
-<script type="application/javascript">
-    function findLink(el) {
-        if (el.tagName == 'A' && el.href) {
-            return el;
-        } else if (el.parentElement) {
-            return findLink(el.parentElement);
-        } else {
-            return null;
-        }
-    };
-
-    function callback(e) {
-        const link = findLink(e.target);
-        if (link == null) { return; }
-        e.preventDefault();
-        // Do stuff here
-        link.classList.add("clicked");
-    };
-
-    document.addEventListener('click', callback, false);
-</script>
-"""
-
+rerun_timer.section("generation")
 st.title("Chat GeoParT!")
 
 with st.expander("Instructions and tips"):
@@ -260,59 +236,87 @@ with st.expander("Instructions and tips"):
 
 categories = stt.st_tags(label="Enter 6 trivia categories", suggestions="Enter a category", maxtags=6, key="categories")
 cola, colb, colc = st.columns([1.1,4.6,1])
+
+@st.fragment(run_every=1)
+def show_generation_progress(job_id):
+    """Polls a background generation job without blocking, and reruns the app once it finishes."""
+    job_manager = get_job_manager()
+    job = job_manager.get(job_id)
+    progress = job.snapshot()
+    if progress["status"] not in (queued, running):
+        st.rerun()
+    if progress["status"] == queued:
+        st.info(f"Waiting for a free generator ({job_manager.queue_position(job)} in line) ...")
+        return
+    st.info(f"Generating ... ({time.time() - progress['started']:.0f}s)")
+    if progressive_generation:
+        for preview_column, category, column_cells in zip(st.columns(len(progress["categories"])), progress["categories"], progress["cells"]):
+            preview_column.markdown(f"**{category.upper()}**")
+            for row, qa in enumerate(column_cells):
+                preview_column.caption(f"${(row+1)*200*multiplier}: {qa[0]}" if qa else f"${(row+1)*200*multiplier} ...")
+
+job_manager = get_job_manager()
+job = job_manager.get(st.session_state.generation_job) if st.session_state.generation_job else None
+job_active = job is not None and job.status in (queued, running)
 if categories:
-    if cola.button("New Game", disabled=len(categories) < 6):
-        token_count_at_start = st.session_state.tokens
-        with st.spinner("Generating ..."):
-            intro_offset = num_intro_slides
-            slide_markdown += "\n---\n"+ r"""<!-- .slide: data-transition="zoom" -->""" + "\n ## [The categories are ... ](#/2) "
-            for category in categories:
-                slide_markdown += f"\n---\n"+ r"""<!-- .slide: data-transition="zoom" -->""" + f"\n ## [{category.upper()}](#/{intro_offset})"
-                intro_offset += 1
-            slide_markdown += "\n---\n" + r"""<!-- .slide: data-transition="fade" data-background-image="https://cdn.vox-cdn.com/thumbor/wEcBsqpKaKmrw6TWYNIDQfOPENk=/172x118:2400x1232/fit-in/1200x600/cdn.vox-cdn.com/uploads/chorus_asset/file/19577016/jeopardy_02.jpg" data-background-size="118%" data-background-position="20%" -->""" + "\n"
-            slide_markdown += "|"
-            jeopardy_set = []
-            loops_to_time = 1
-            loop_count = 1
-            timer_start = time.time()
-            for category in categories:
-                slide_markdown += f" {category.upper()} |"
-                qa_array = retry_get_jeopardy_trivia(category) 
-
-                if qa_array[0][0] != 0:
-                    jeopardy_set.append(qa_array)
-                
-                time_taken = time.time() - timer_start
-                if loop_count < 2 and time_taken > 10:
-                    colb.write("This might take a few minutes ...")
-                
-                loop_count += 1
-
-            slide_markdown += "\n|:-:|:-:|:-:|:-:|:-:|:-:|"
-            for row_index in range(5):
-                slide_markdown += "\n|"
-                for column_index in range(6):
-                    slide_markdown += f"[${(row_index+1)*200*multiplier}](#/{column_index*5 + row_index + intro_offset})|"
-            slide_markdown += "\n"
-            if len(jeopardy_set) == 6:
-                answerfiletxt = ""
-                for column in range(6):
-                    for row in range(5):
-                        slide_markdown += "\n---\n"
-                        slide_markdown += f'<!-- .slide: data-transition="zoom" -->\n### ({categories[column].upper()}) \n# [${((row+1)*200*multiplier)}](#/{column*5 + row + intro_offset}/1)'
-                        slide_markdown += "\n--\n"
-                        slide_markdown += f'<!-- .slide: data-transition="zoom" data-autoslide="{question_timer*1000}" -->\n### [{jeopardy_set[column][row][0]}](#/{column*5 + row + intro_offset}/2)\nAnswer:{jeopardy_set[column][row][1]}'
-                        slide_markdown += "\n--\n"
-                        slide_markdown += f'<!-- .slide: data-transition="zoom-in fade-out" -->\n### [{jeopardy_set[column][row][1]}](#/{intro_offset - 1})'
-                        answerfiletxt += f"{categories[column].upper()}\n\t[{((row+1)*200*multiplier)}]: Q:{jeopardy_set[column][row][0]}\n\t\tA:{jeopardy_set[column][row][1]}\n\n"
-                slide_markdown += slide_markdown_close
-
-                new_key = str(uuid.uuid4())
-                st.session_state.reveal = new_key
-                st.session_state.markdown = slide_markdown
-                st.session_state.lastdelta = st.session_state.delta
-                st.session_state.delta = st.session_state.tokens - token_count_at_start 
-                st.session_state.answerfiletxt = answerfiletxt
+    if cola.button("New Game", disabled=len(categories) < 6 or job_active):
+        banked_sets = get_question_bank().get_categories(categories) if use_question_bank else {}
+        generation = {"limiter": get_rate_limiter(requests_per_minute, tokens_per_minute),
+                      "retry_policy": get_retry_policy(max_attempts),
+                      "client": openai_client}
+        work = functools.partial(generate_board,
+                                 banked_sets=banked_sets,
+                                 whole_board=generation_mode == "Whole board in one request",
+                                 generation=generation,
+                                 cache=get_response_cache(cache_ttl_hours, cache_variants) if use_cache else None,
+                                 context=PromptContext(history_window=history_window),
+                                 progressive=progressive_generation,
+                                 concurrent=concurrent_generation,
+                                 single_flight=get_single_flight(cache_variants) if share_requests else None,
+                                 question_index=get_question_index() if avoid_repeats else None)
+        try:
+            job = job_manager.submit(categories, work)
+            # Keep the job in the URL too, so a refreshed page picks the board up when it's done
+            st.session_state.generation_job = job.job_id
+            st.query_params["job"] = job.job_id
+            job_active = True
+        except JobQueueFullError as e:
+            st.error(str(e))
+
+if job_active:
+    show_generation_progress(job.job_id)
+elif job is not None and st.session_state.collected_job != job.job_id:
+    st.session_state.collected_job = job.job_id
+    stats = job.stats
+    # The job manager has already recorded the job for the whole process; this only updates the session's own view
+    if job.error:
+        st.error(f"Generation failed: {job.error}")
+    for error in stats.errors:
+        st.error(error)
+    st.session_state.tokens += stats.tokens
+    st.session_state.lastcost = sum(record["cost"] for record in stats.requests)
+    st.session_state.telemetry.add(stats)
+    st.session_state.cache_hits += stats.cache_hits
+    st.session_state.cache_misses += stats.cache_misses
+    st.session_state.shared_requests += stats.shared_requests
+    st.session_state.repeated_rows += stats.repeated_rows
+
+    jeopardy_set = job.result or []
+    incomplete_categories = [category for category, qa_array in zip(job.categories, jeopardy_set) if not is_complete(qa_array)]
+    if incomplete_categories:
+        st.error(f"Couldn't generate every question for {', '.join(incomplete_categories)}. Click New Game to try again.")
+    elif len(jeopardy_set) == 6:
+        game = make_game(job.categories, jeopardy_set, multiplier=multiplier, question_timer=question_timer, num_intro_slides=num_intro_slides)
+        slide_markdown, answerfiletxt = render_game(game)
+
+        new_key = str(uuid.uuid4())
+        st.session_state.reveal = new_key
+        session_blobs.set("markdown", slide_markdown)
+        st.session_state.open_cells = []
+        st.session_state.lastdelta = st.session_state.delta
+        st.session_state.delta = stats.tokens
+        session_blobs.set("answerfiletxt", answerfiletxt)
+        st.session_state.game = game
 
 ## Presenting generated content and data ======================================================
 btn_settings_editor_btns = [{
@@ -367,8 +371,7 @@ reveal_snippets = [[{
                     } 
                   ],""]
 
-if 'css' not in st.session_state:
-    st.session_state.css = """
+default_css = """
 body.reveal-viewport {
     background: #2b09cf;             /*slide background color*/
 }
@@ -418,18 +421,40 @@ body.reveal-viewport {
     text-shadow: none;
 }
 """
+if 'css' not in session_blobs:
+    session_blobs.set("css", default_css)
 
-if st.session_state.markdown != "":  
+if session_blobs.get("markdown") != "":  
+    rerun_timer.section("customize")
     with st.expander("Customize"):
-        markup_response_dict = code_editor(st.session_state.markdown, lang="markdown", height=25, snippets=reveal_snippets, buttons=btn_settings_editor_btns, allow_reset=True, key="code_editor")
-        if markup_response_dict['type'] == "submit" and len(markup_response_dict['text']) != 0:
-            st.session_state.markdown = markup_response_dict['text']
+        # The whole document only goes to the browser while it's being edited
+        if st.toggle("Edit the slides' markdown"):
+            markup_response_dict = code_editor_component.code_editor(session_blobs.get("markdown"), lang="markdown", height=25, snippets=reveal_snippets, buttons=btn_settings_editor_btns, allow_reset=True, key="code_editor")
+            if markup_response_dict['type'] == "submit" and len(markup_response_dict['text']) != 0:
+                # Edits to questions and answers are applied to the game itself, anything else keeps the edited markdown
+                patched_game = patch_game(st.session_state.game, markup_response_dict['text']) if st.session_state.game else None
+                if patched_game:
+                    st.session_state.game = patched_game
+                    slide_markdown, answerfiletxt = render_game(patched_game)
+                    session_blobs.set("answerfiletxt", answerfiletxt)
+                else:
+                    slide_markdown = markup_response_dict['text']
+                session_blobs.set("markdown", slide_markdown)
         
-        css_response_dict = code_editor(st.session_state.css, lang="css", height=15, buttons=btn_settings_editor_btns, allow_reset=True, key="css_editor")
+        css_response_dict = code_editor_component.code_editor(session_blobs.get("css"), lang="css", height=15, buttons=btn_settings_editor_btns, allow_reset=True, key="css_editor")
         if css_response_dict['type'] == "submit" and len(css_response_dict['text']) != 0:
-            st.session_state.css = css_response_dict['text']
-
-    reveal_state = rs.slides(st.session_state.markdown, 
+            session_blobs.set("css", css_response_dict['text'])
+
+    rerun_timer.section("slides")
+    slides_markdown = session_blobs.get("markdown")
+    game = st.session_state.game
+    lazy_game = lazy_slides and game is not None and render_game(game)[0] == slides_markdown
+    if lazy_game:
+        # Send the board with only the questions opened so far. Any new document makes the browser rebuild the whole deck,
+        # so opened cells are only ever added, and drawn as played since the clicks the slides' script marked are lost
+        game_cell_at_slide = lambda slide: cell_at_slide(slide, len(game["categories"]), len(game["values"]), game["settings"].get("num_intro_slides", num_intro_slides))
+        slides_markdown = render_game(game, open_cells=st.session_state.open_cells, played_cells=st.session_state.open_cells)[0]
+    reveal_state = rs.slides(slides_markdown, 
           height=410,
           config={
                   "width": 1800, 
@@ -443,24 +468,80 @@ if st.session_state.markdown != "":
                   "plugins": ["markdown", "highlight", "katex", "notes", "search", "zoom"]
                  }, 
           theme="night",
-          css=st.session_state.css,
+          css=session_blobs.get("css"),
           allow_unsafe_html=True,
           key=st.session_state.reveal
           )
+    opened_cell = game_cell_at_slide(reveal_state["indexh"]) if lazy_game and reveal_state else None
+    if opened_cell is not None and opened_cell not in st.session_state.open_cells:
+        st.session_state.open_cells = st.session_state.open_cells + [opened_cell]
+        st.rerun()
+    rerun_timer.section("metrics")
     with st.expander("API Token Metrics"):
         col1, col2, col3, col4, col5, col6, col7 = st.columns([2, 3, 1, 3, 1, 3, 2])
-        col2.metric(label="Usage", value=str(round(100*st.session_state.delta/4096, 1)) + "%", delta=str(round(100*(st.session_state.delta - st.session_state.lastdelta)/4096, 1)) + "%")
+        session_metrics = st.session_state.telemetry.summary()
+        model_context = context_limit(default_model)
+        col2.metric(label="Usage", value=str(round(100*st.session_state.delta/model_context, 1)) + "%", delta=str(round(100*(st.session_state.delta - st.session_state.lastdelta)/model_context, 1)) + "%")
         col4.metric(label="Tokens", value=st.session_state.tokens, delta=st.session_state.delta)
-        col6.metric(label="Cost", value="$" + str(round((st.session_state.tokens*0.005/2500), 3)), delta="$" + str(round((st.session_state.delta * 0.005/2500), 3)))
-
-    with open('ChatGeoParT.py', 'r') as f:
-        app_to_download = f.read()
-
-    download_file = create_download_zip_file(st.session_state.markdown, st.session_state.css, st.session_state.answerfiletxt, app_to_download)
-    with open('ChatGeoParT.zip', 'wb') as f:
-        f.write(download_file.getbuffer())
-    download_file.close()
-
-    with open('ChatGeoParT.zip', 'rb') as f:
-        colc.download_button('Download', f, file_name='ChatGeoParT.zip')
-    
+        col6.metric(label="Cost", value="$" + str(round(session_metrics["cost"], 3)), delta="$" + str(round(st.session_state.lastcost, 3)))
+        col1, col2, col3, col4, col5, col6, col7 = st.columns([2, 3, 1, 3, 1, 3, 2])
+        col2.metric(label="Cache hits", value=st.session_state.cache_hits)
+        col4.metric(label="Cache misses", value=st.session_state.cache_misses)
+        cache_lookups = st.session_state.cache_hits + st.session_state.cache_misses
+        col6.metric(label="Cache hit rate", value=str(round(100*st.session_state.cache_hits/cache_lookups, 1) if cache_lookups else 0.0) + "%")
+        col1, col2, col3, col4, col5, col6, col7 = st.columns([2, 3, 1, 3, 1, 3, 2])
+        col2.metric(label="Latency p50 / p95", value=f"{session_metrics['p50_latency']:.1f}s / {session_metrics['p95_latency']:.1f}s")
+        col4.metric(label="Tokens/s", value=round(session_metrics["tokens_per_second"], 1))
+        col6.metric(label="Parsed rows", value=str(round(100*session_metrics["parse_success_rate"], 1)) + "%")
+        st.caption(f"Session: {session_metrics['requests']} requests, {session_metrics['retries']} retries, {session_metrics['errors']} failed, "
+                   f"{st.session_state.shared_requests} shared with other players, {st.session_state.repeated_rows} repeated questions requested again.")
+        process_metrics = get_process_telemetry().summary()
+        st.caption(f"All sessions: {process_metrics['requests']} requests, {process_metrics['retries']} retries, {process_metrics['errors']} failed, "
+                   f"latency p50 {process_metrics['p50_latency']:.1f}s / p95 {process_metrics['p95_latency']:.1f}s, "
+                   f"{process_metrics['tokens_per_second']:.1f} tokens/s, ${process_metrics['cost']:.3f}. Every request is logged to {default_log_path}.")
+        session_footprint = session_blobs.footprint()
+        # Held in st.session_state itself rather than in the blob store, so never spilled
+        session_memory = {"game": len(dumps_game(st.session_state.game).encode()) if st.session_state.game else 0,
+                          "telemetry": st.session_state.telemetry.footprint(),
+                          "download": st.session_state.game_export.footprint()}
+        blob_metrics = get_blob_store().summary()
+        st.caption(f"Session state: {(sum(session_footprint.values()) + sum(session_memory.values()))/1024:.1f} KiB ("
+                   + ", ".join(f"{name} {size/1024:.1f} KiB" for name, size in session_footprint.items()) + "; kept in memory: "
+                   + ", ".join(f"{name} {size/1024:.1f} KiB" for name, size in session_memory.items()) + "). "
+                   f"Shared store: {blob_metrics['memory_blobs']} blobs, {blob_metrics['memory_bytes']/1024:.0f} KiB in memory, "
+                   f"{blob_metrics['disk_bytes']/1024:.0f} KiB on disk, {blob_metrics['spills']} spilled, {blob_metrics['reloads']} reloaded.")
+        startup_timings = get_startup_timings()
+        st.caption(f"Cold start: imports {startup_timings['imports']:.2f}s, first page {startup_timings['first_page'] or 0:.2f}s, loaded later: "
+                   + (", ".join(f"{name} {seconds:.2f}s" for name, seconds in import_timings.items()) or "nothing") + f". Logged to {default_startup_log_path}.")
+
+    rerun_timer.section("download")
+    # The archive is only built when Download is clicked, and again only if the game changed since
+    export = st.session_state.game_export
+    game = st.session_state.game
+    colc.download_button('Download', lambda: export.archive_bytes(game, session_blobs.get("markdown"), session_blobs.get("css"), session_blobs.get("answerfiletxt")),
+                         file_name='ChatGeoParT.zip', mime='application/zip')
+
+# Only shown with ?admin=1 in the URL
+if st.query_params.get("admin") == "1":
+    rerun_timer.section("admin")
+    profiler = get_profiler()
+    with st.expander("Admin: rerun profile"):
+        profiler.track_allocations = st.toggle("Track allocations per section (tracemalloc, slows every session down)", value=profiler.track_allocations)
+        profile = profiler.summary()
+        st.dataframe([{"section": span["span"], "runs": span["count"], "p50 (ms)": round(1000*span["p50_seconds"], 1),
+                       "p95 (ms)": round(1000*span["p95_seconds"], 1), "max (ms)": round(1000*span["max_seconds"], 1),
+                       "allocated (KiB)": round(span["allocated_bytes"]/1024, 1), "peak (KiB)": round(span["peak_bytes"]/1024, 1)} for span in profile],
+                     hide_index=True)
+        st.caption(f"All sessions since {time.strftime('%Y-%m-%d %H:%M', time.localtime(profiler.started))}; percentiles over the last {profiler.max_samples} runs of each section. "
+                   "Reruns cut short to show a new slide or generation progress are only counted per section.")
+        cold, colp = st.columns(2)
+        cold.download_button("Export JSONL", profiler.to_jsonl, file_name="profile.jsonl", mime="application/x-ndjson")
+        colp.download_button("Export Prometheus", profiler.to_prometheus, file_name="profile.prom", mime="text/plain")
+
+# Time the first page this process serves, from the first import to the end of the script
+startup_timings = get_startup_timings()
+if startup_timings["first_page"] is None:
+    startup_timings["first_page"] = time.perf_counter() - script_start
+    log_startup(startup_timings)
+
+rerun_timer.finish()
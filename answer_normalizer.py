@@ -0,0 +1,66 @@
+import re
+
+# One line of a reply, '- $amount | Question : Answer', read in a single match. Only the first dollar amount
+# on a line counts, and 1000 is tried last so '$2000' stays in the 200 row like before. Optional 'Question:'
+# and 'Answer:' labels are only recognised where they start their part, so clues mentioning them stay intact.
+reply_line_pattern = re.compile(r"^[ \t]*[$-][^|\n]*?(?P<amount>200|400|600|800|1000)[^|\n]*\|"
+                                r"[ \t]*(?:(?:question|q)[ \t]*:[ \t]*)?(?P<question>[^:|\n]*?[^:|\s])[ \t]*:"
+                                r"[ \t]*(?:(?:answer|a)[ \t]*:[ \t]*)?(?P<answer>[^:|\n]*?[^:|\s])[ \t\r]*$", re.MULTILINE | re.IGNORECASE)
+question_lead_pattern = re.compile(r"[\s\-:]*(?P<word>who|what|when|where|why|which)\b(?:\s+(?P<verb>is|are|was|were)\b\s*)?", re.IGNORECASE)
+answer_lead_pattern = re.compile(r"[\s\-:]*(?:who|what|when|where|why|which)\b", re.IGNORECASE)
+
+row_for_amount = {"200": 0, "400": 1, "600": 2, "800": 3, "1000": 4}
+
+
+def format_qa_response(response):
+    """
+    Turns a [question, answer] pair into a Jeopardy clue and its answer in the form of a question.
+    returns: [clue, "WHAT IS ...?"]
+    """
+    question, answer = response[0], response[1]
+    answer_start = ""
+    lead = question_lead_pattern.match(question)
+    if lead:
+        word, verb = lead.groups()
+        if verb:
+            # 'What is the largest planet?' -> 'The largest planet', answered with 'What is ...?'
+            question = question[lead.end():]
+            question = question[:1].upper() + question[1:]
+            answer_start = word.capitalize() + " " + verb.lower() + " "
+        elif word.lower() == "who":
+            question = question[:lead.start(1)] + "This person" + question[lead.end(1):]
+            answer_start = "Who is "
+        elif word.lower() == "what":
+            question = question[:lead.start(1)] + "This" + question[lead.end(1):]
+            answer_start = "What is "
+    answer = answer.strip()
+    if not answer_lead_pattern.match(answer):
+        answer = answer_start + answer
+    question = question.strip()
+    if question.endswith("?"):
+        question = question[:-1].rstrip()
+    if not answer.endswith("?"):
+        answer = answer.removesuffix(".").strip() + "?"
+    return [question, answer.upper()]
+
+def parse_trivia_line(line):
+    """returns: (row, [clue, answer]) for a well formed line of a reply, otherwise None"""
+    line = reply_line_pattern.fullmatch(line.rstrip("\n"))
+    if line is None:
+        return None
+    amount, question, answer = line.groups()
+    return row_for_amount[amount], format_qa_response([question, answer])
+
+def parse_trivia_response(response, rows=5):
+    """returns: one [clue, answer] per row found in the reply, [0] for rows that are missing"""
+    trivia_questions = [[0] for row in range(rows)]
+    # A single scan over the whole reply instead of splitting it into lines and each line into parts
+    for amount, question, answer in reply_line_pattern.findall(response or ""):
+        row = row_for_amount[amount]
+        if row < rows:
+            trivia_questions[row] = format_qa_response([question, answer])
+    return trivia_questions
+
+def parse_trivia_responses(responses, rows=5):
+    """returns: parse_trivia_response of every reply, e.g. of a whole question bank"""
+    return [parse_trivia_response(response, rows) for response in responses]
@@ -0,0 +1,131 @@
+"""
+Generates many Chat GeoParT games without the Streamlit UI, straight into the player's games/ directory.
+
+    python batch_generate.py boards.txt --workers 4 --rpm 120
+
+Each line of the boards file holds one board's categories separated by commas. Games are written
+as structured game files named after their line number and categories, so running the same command
+again after an interruption only generates the boards that are still missing. Questions that repeat
+one already in the question index (any earlier game, including this batch's) are requested again.
+"""
+import os
+import re
+import sys
+import time
+import argparse
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, as_completed
+from rate_limiter import TokenBucketLimiter
+from retry_policy import RetryPolicy
+from trivia_generator import GenerationStats, generate_jeopardy_set, is_complete
+from game_format import make_game, dumps_game, game_file_extension
+from question_index import QuestionIndex, default_index_path
+
+default_games_dir = "games"
+
+
+def read_boards(path, separator=","):
+    """returns: one list of categories per non-empty line of `path`, with its line number"""
+    boards = []
+    with open(path, "r") as f:
+        for line_number, line in enumerate(f, 1):
+            categories = [category.strip() for category in line.split(separator) if category.strip()]
+            if categories:
+                boards.append((line_number, categories))
+    return boards
+
+def game_file_name(line_number, categories):
+    slug = re.sub(r"[^a-z0-9]+", "-", " ".join(categories[:3]).lower()).strip("-")[:60]
+    return f"batch-{line_number:04d}-{slug}{game_file_extension}"
+
+def generate_game(line_number, categories, games_dir, limiter, retry_policy, settings, question_index=None):
+    """
+    Generates one board and writes it to `games_dir`, unless it's already there.
+    returns: (file name, status, seconds, tokens, errors)
+    """
+    file_name = game_file_name(line_number, categories)
+    path = os.path.join(games_dir, file_name)
+    if os.path.exists(path):
+        return file_name, "skipped", 0.0, 0, []
+    timer_start = time.time()
+    stats = GenerationStats()
+    duplicates = question_index.board() if question_index else None
+    jeopardy_set = generate_jeopardy_set(categories, limiter=limiter, stats=stats, retry_policy=retry_policy, duplicates=duplicates)
+    # Incomplete boards aren't written, so the next run tries them again
+    if not all(is_complete(trivia_questions) for trivia_questions in jeopardy_set):
+        return file_name, "failed", time.time() - timer_start, stats.tokens, stats.errors
+    game = make_game(categories, jeopardy_set, multiplier=settings["multiplier"], question_timer=settings["question_timer"])
+    temporary_path = path + ".tmp"
+    with open(temporary_path, "w") as f:
+        f.write(dumps_game(game))
+    os.replace(temporary_path, path)
+    # Indexed under the same source the player's game library uses for this file
+    if question_index:
+        question_index.replace_source(os.path.abspath(path), [qa for column in jeopardy_set for qa in column])
+    return file_name, "done", time.time() - timer_start, stats.tokens, stats.errors
+
+def generate_games(boards, games_dir, requests_per_minute, tokens_per_minute, workers, settings, batch_start, question_index=None):
+    """Generates `boards` on a thread pool sharing one rate limiter; runs in each worker process."""
+    limiter = TokenBucketLimiter(requests_per_minute, tokens_per_minute)
+    retry_policy = RetryPolicy()
+    results = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(generate_game, line_number, categories, games_dir, limiter, retry_policy, settings, question_index) for line_number, categories in boards]
+        for future in as_completed(futures):
+            file_name, status, seconds, tokens, errors = future.result()
+            results.append((file_name, status, seconds, tokens, errors))
+            if status != "skipped":
+                print(f"{status:>7} {file_name} in {seconds:.1f}s, {tokens} tokens "
+                      f"({(time.time() - batch_start)/60:.1f} min into the batch)", flush=True)
+            for error in errors:
+                print(f"        {error}", file=sys.stderr, flush=True)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate Chat GeoParT games in bulk into the player's games directory.",
+                                     epilog="OpenAI credentials are read from OPENAI_API_KEY and OPENAI_ORGANIZATION.")
+    parser.add_argument("boards_file", help="one board per line, categories separated by commas")
+    parser.add_argument("--games-dir", default=default_games_dir, help="where the player looks for games")
+    parser.add_argument("--separator", default=",", help="separator between the categories of a board")
+    parser.add_argument("--workers", type=int, default=4, help="boards generated at once per process")
+    parser.add_argument("--processes", type=int, default=1, help="worker processes; the rate limits are split between them")
+    parser.add_argument("--rpm", type=int, default=60, help="API request limit for the whole batch (requests/min)")
+    parser.add_argument("--tpm", type=int, default=90000, help="API token limit for the whole batch (tokens/min)")
+    parser.add_argument("--multiplier", type=int, default=1, help="multiplier for the values on the boards")
+    parser.add_argument("--timer", type=int, default=10, help="seconds given to players to answer")
+    parser.add_argument("--index", default=default_index_path, help="question index used to avoid repeated questions")
+    parser.add_argument("--allow-repeats", action="store_true", help="don't check questions against the question index")
+    args = parser.parse_args(argv)
+
+    boards = read_boards(args.boards_file, args.separator)
+    os.makedirs(args.games_dir, exist_ok=True)
+    settings = {"multiplier": args.multiplier, "question_timer": args.timer}
+    question_index = None if args.allow_repeats else QuestionIndex(args.index)
+    processes = max(1, min(args.processes, len(boards)))
+    batch_start = time.time()
+
+    if processes == 1:
+        results = generate_games(boards, args.games_dir, args.rpm, args.tpm, args.workers, settings, batch_start, question_index)
+    else:
+        # Every process gets an equal share of the boards and of the rate limits, so the batch as a whole stays under them
+        results = []
+        with ProcessPoolExecutor(max_workers=processes) as executor:
+            futures = [executor.submit(generate_games, boards[i::processes], args.games_dir, max(1, args.rpm // processes),
+                                       max(1000, args.tpm // processes), args.workers, settings, batch_start, question_index) for i in range(processes)]
+            for future in futures:
+                results += future.result()
+
+    minutes = (time.time() - batch_start) / 60
+    done = sum(status == "done" for file_name, status, seconds, tokens, errors in results)
+    skipped = sum(status == "skipped" for file_name, status, seconds, tokens, errors in results)
+    failed = sum(status == "failed" for file_name, status, seconds, tokens, errors in results)
+    tokens = sum(tokens for file_name, status, seconds, tokens, errors in results)
+    print(f"Generated {done} boards ({skipped} already there, {failed} incomplete) in {minutes:.1f} min: "
+          f"{done / minutes if minutes else 0.0:.1f} boards/min, {tokens} tokens.")
+    if failed:
+        print("Run the same command again to retry the incomplete boards.")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
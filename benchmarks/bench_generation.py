@@ -0,0 +1,121 @@
+"""
+End-to-end benchmarks of board generation against the local mock OpenAI server.
+
+    python -m benchmarks.bench_generation --latency 0.2 --malformed-rate 0.1 --rate-limit-rate 0.05
+
+Each scenario drives the app's own code paths and reports wall time, API requests,
+parse success rate and peak traced memory. Everything runs offline; warm the tokenizer
+cache first (python tokenizer.py warm) or token counts fall back to an estimate.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import openai
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from benchmarks.mock_openai_server import MockSettings, start_server
+from board_slides import build_slide_markdown
+from game_export import create_download_zip_file
+from rate_limiter import TokenBucketLimiter
+from retry_policy import RetryPolicy
+from structured_board import generate_structured_board
+from trivia_generator import (GenerationStats, category_prompt, query_ai, get_jeopardy_trivia, retry_get_jeopardy_trivia,
+                              generate_jeopardy_set, stream_jeopardy_set, format_qa_response)
+
+categories = ["World Capitals", "Famous Painters", "Space Exploration", "Ancient Rome", "Chemistry", "Movie Quotes"]
+sample_qa = [["What is the largest planet in our solar system?", "Jupiter"],
+             ["Who painted the Mona Lisa?", "Leonardo da Vinci"],
+             ["This element has the chemical symbol O", "Oxygen."]]
+
+
+def run_scenario(name, settings, function, repeat):
+    stats = GenerationStats()
+    requests_before = settings.requests
+    tracemalloc.start()
+    timer_start = time.perf_counter()
+    for i in range(repeat):
+        function(stats)
+    wall_time = time.perf_counter() - timer_start
+    peak_memory = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    parse_attempts = stats.parsed_rows + stats.failed_rows
+    return {
+        "scenario": name,
+        "repeat": repeat,
+        "wall_time": wall_time,
+        "requests": settings.requests - requests_before,
+        "retries": stats.retries,
+        "errors": len(stats.errors),
+        "parse_success_rate": stats.parsed_rows / parse_attempts if parse_attempts else None,
+        "peak_memory_kb": peak_memory / 1024,
+    }
+
+def full_board():
+    return [[format_qa_response(list(sample_qa[(column + row) % len(sample_qa)])) for row in range(5)] for column in range(6)]
+
+def scenarios(args, limiter, retry_policy):
+    generation = {"limiter": limiter, "retry_policy": retry_policy}
+    board = full_board()
+    markdown, answers = build_slide_markdown(categories, board)
+    player_files = {}
+    for file_name in ["ChatGeoParT.py", "game_library.py", "game_format.py", "board_slides.py", "question_index.py"]:
+        with open(os.path.join(repo_dir, file_name), "r") as f:
+            player_files[file_name] = f.read()
+    return [
+        ("query_ai", lambda stats: query_ai(category_prompt(categories[0]), stats=stats, **generation), args.boards),
+        ("get_jeopardy_trivia", lambda stats: get_jeopardy_trivia(categories[0], stats=stats, **generation), args.boards),
+        ("retry_get_jeopardy_trivia", lambda stats: retry_get_jeopardy_trivia(categories[0], stats=stats, **generation), args.boards),
+        ("board, sequential", lambda stats: generate_jeopardy_set(categories, stats=stats, concurrent=False, **generation), args.boards),
+        ("board, concurrent", lambda stats: generate_jeopardy_set(categories, stats=stats, **generation), args.boards),
+        ("board, streamed", lambda stats: list(stream_jeopardy_set(categories, stats=stats, **generation)), args.boards),
+        ("board, one JSON request", lambda stats: generate_structured_board(categories, stats=stats, **generation), args.boards),
+        ("format_qa_response", lambda stats: [format_qa_response(list(qa)) for qa in sample_qa], args.iterations),
+        ("slide markdown assembly", lambda stats: build_slide_markdown(categories, board), args.iterations),
+        ("create_download_zip_file", lambda stats: create_download_zip_file(markdown, "css", answers, player_files).close(), args.iterations // 10),
+    ]
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Chat GeoParT board generation against a local mock OpenAI API.")
+    parser.add_argument("--latency", type=float, default=0.2, help="mock seconds before each reply starts")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="mock seconds per completion token")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of mock requests answered with HTTP 429")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of mock clues returned in a broken format")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--boards", type=int, default=2, help="repetitions of each API scenario")
+    parser.add_argument("--iterations", type=int, default=1000, help="repetitions of each offline scenario")
+    parser.add_argument("--rpm", type=int, default=10000, help="client request limit (requests/min)")
+    parser.add_argument("--tpm", type=int, default=10000000, help="client token limit (tokens/min)")
+    parser.add_argument("--only", default=None, help="run only scenarios whose name contains this text")
+    parser.add_argument("--json", default=None, help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(args.latency, args.token_latency, args.rate_limit_rate, 0.05, args.malformed_rate, args.seed)
+    server, api_base = start_server(settings)
+    openai.api_base = api_base
+    openai.api_key = "sk-mock"
+    openai.organization = None
+
+    results = []
+    limiter = TokenBucketLimiter(args.rpm, args.tpm)
+    retry_policy = RetryPolicy(base_delay=0.05, max_delay=1.0)
+    print(f"{'scenario':<28}{'runs':>6}{'wall s':>10}{'requests':>10}{'retries':>9}{'parsed':>9}{'peak KiB':>10}")
+    for name, function, repeat in scenarios(args, limiter, retry_policy):
+        if args.only and args.only not in name:
+            continue
+        result = run_scenario(name, settings, function, repeat)
+        results.append(result)
+        parsed = "-" if result["parse_success_rate"] is None else f"{100*result['parse_success_rate']:.0f}%"
+        print(f"{name:<28}{repeat:>6}{result['wall_time']:>10.3f}{result['requests']:>10}{result['retries']:>9}{parsed:>9}{result['peak_memory_kb']:>10.0f}")
+    server.shutdown()
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""
+Throughput and correctness benchmark of answer normalization over a recorded corpus of replies.
+
+    python -m benchmarks.bench_normalization --replies 20000
+    python -m benchmarks.bench_normalization --write-corpus
+
+The corpus (normalization_corpus.jsonl, next to this file) holds category replies in the
+formats models actually produce: labelled or unlabelled clues, answers already phrased as
+questions, chatty preambles, Windows line endings and broken lines. Each reply is stored with
+the clue and answer expected for every row, written by hand rather than by the normalizer,
+so the benchmark reports how many rows parse and how many come out right.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+repo_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, repo_dir)
+
+from answer_normalizer import parse_trivia_responses
+
+default_corpus_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "normalization_corpus.jsonl")
+row_amounts = [200, 400, 600, 800, 1000]
+
+# (question as a model writes it, answer as a model writes it, expected clue, expected answer)
+facts = [
+    ("What is the largest planet in our solar system?", "Jupiter", "The largest planet in our solar system", "WHAT IS JUPITER?"),
+    ("Who painted the Mona Lisa?", "Leonardo da Vinci", "This person painted the Mona Lisa", "WHO IS LEONARDO DA VINCI?"),
+    ("This element has the chemical symbol O", "Oxygen.", "This element has the chemical symbol O", "OXYGEN?"),
+    ("What was the first artificial satellite?", "Sputnik 1", "The first artificial satellite", "WHAT WAS SPUTNIK 1?"),
+    ("Which planet is known as the red planet?", "What is Mars?", "Which planet is known as the red planet", "WHAT IS MARS?"),
+    ("This city is home to the Louvre", "Paris", "This city is home to the Louvre", "PARIS?"),
+    ("Who were the four members of the Beatles?", "John, Paul, George and Ringo", "The four members of the Beatles", "WHO WERE JOHN, PAUL, GEORGE AND RINGO?"),
+    ("What year did the Berlin Wall fall?", "1989.", "This year did the Berlin Wall fall", "WHAT IS 1989?"),
+    ("This Roman emperor made his horse a consul, or so the answer goes", "Caligula", "This Roman emperor made his horse a consul, or so the answer goes", "CALIGULA?"),
+    ("What is the answer to life, the universe and everything?", "42", "The answer to life, the universe and everything", "WHAT IS 42?"),
+    ("Who is the author of 'Pride and Prejudice'?", "Jane Austen", "The author of 'Pride and Prejudice'", "WHO IS JANE AUSTEN?"),
+    ("This gas makes up about 78% of Earth's atmosphere", "What is nitrogen?", "This gas makes up about 78% of Earth's atmosphere", "WHAT IS NITROGEN?"),
+    ("What are the three primary colors of light?", "Red, green and blue", "The three primary colors of light", "WHAT ARE RED, GREEN AND BLUE?"),
+    ("Who wrote Hamlet?", "William Shakespeare.", "This person wrote Hamlet", "WHO IS WILLIAM SHAKESPEARE?"),
+    ("This Q-shaped answer key opens the vault", "Question mark key", "This Q-shaped answer key opens the vault", "QUESTION MARK KEY?"),
+]
+
+def line_formats():
+    """returns: {format name: function(amount, question, answer) -> (reply line, whether it should parse)}"""
+    return {
+        "standard": lambda amount, question, answer: (f"- ${amount} | {question} : {answer}", True),
+        "no bullet": lambda amount, question, answer: (f"${amount} | {question} : {answer}", True),
+        "labelled": lambda amount, question, answer: (f"- ${amount} | Question: {question} : Answer: {answer}", True),
+        "short labels": lambda amount, question, answer: (f"- ${amount} | Q: {question} : A: {answer}", True),
+        "indented": lambda amount, question, answer: (f"   - ${amount} | {question} : {answer}", True),
+        "tight spacing": lambda amount, question, answer: (f"-${amount}|{question}:{answer}", True),
+        "numbered": lambda amount, question, answer: (f"{amount}) {question} - {answer}", False),
+        "extra pipe": lambda amount, question, answer: (f"- ${amount} | {question} | {answer}", False),
+    }
+
+def make_reply(randomizer, format_name, line_format):
+    """returns: (reply, one [clue, answer] or None per row)"""
+    lines, expected = [], []
+    for amount in row_amounts:
+        question, answer, expected_clue, expected_answer = randomizer.choice(facts)
+        line, parses = line_format(amount, question, answer)
+        lines.append(line)
+        expected.append([expected_clue, expected_answer] if parses else None)
+    preamble = randomizer.random() < 0.3
+    reply = "\n".join(lines)
+    if preamble:
+        reply = "Sure! Here are your clues:\n\n" + reply + "\n\nGood luck!"
+    if randomizer.random() < 0.2:
+        reply = reply.replace("\n", "\r\n")
+    return reply, expected
+
+def write_corpus(path=default_corpus_path, replies_per_format=12, seed=1):
+    randomizer = random.Random(seed)
+    with open(path, "w") as f:
+        for format_name, line_format in line_formats().items():
+            for i in range(replies_per_format):
+                reply, expected = make_reply(randomizer, format_name, line_format)
+                f.write(json.dumps({"format": format_name, "reply": reply, "expected": expected}) + "\n")
+
+def read_corpus(path=default_corpus_path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def check(entries, parsed_replies):
+    """
+    returns: {format name: [rows, rows parsed, rows expected to parse, of those the rows parsed
+    correctly, rows parsed that shouldn't have been]}
+    """
+    results = {}
+    for entry, trivia_questions in zip(entries, parsed_replies):
+        counts = results.setdefault(entry["format"], [0, 0, 0, 0, 0])
+        for expected, qa in zip(entry["expected"], trivia_questions):
+            parsed = len(qa) == 2
+            counts[0] += 1
+            counts[1] += parsed
+            counts[2] += expected is not None
+            counts[3] += expected is not None and qa == expected
+            counts[4] += expected is None and parsed
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Chat GeoParT answer normalization over a recorded corpus of replies.")
+    parser.add_argument("--corpus", default=default_corpus_path)
+    parser.add_argument("--replies", type=int, default=20000, help="replies to normalize; the corpus is repeated to reach this")
+    parser.add_argument("--write-corpus", action="store_true", help="regenerate the corpus file and exit")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    if args.write_corpus:
+        write_corpus(args.corpus, seed=args.seed)
+        print(f"Wrote {len(read_corpus(args.corpus))} replies to {args.corpus}")
+        return
+
+    entries = read_corpus(args.corpus)
+    replies = [entry["reply"] for entry in entries]
+    batch = (replies * (args.replies // len(replies) + 1))[:args.replies]
+    timer_start = time.perf_counter()
+    parse_trivia_responses(batch)
+    seconds = time.perf_counter() - timer_start
+
+    # Correctness only counts rows that should parse; rows that shouldn't are only checked for not parsing
+    print(f"{'format':<16}{'rows':>6}{'parsed':>9}{'correct':>9}")
+    totals = [0, 0, 0, 0, 0]
+    for format_name, counts in check(entries, parse_trivia_responses(replies)).items():
+        totals = [total + count for total, count in zip(totals, counts)]
+        rows, parsed, parseable, correct, misparsed = counts
+        print(f"{format_name:<16}{rows:>6}{100*parsed/rows:>8.0f}%" + (f"{100*correct/parseable:>8.0f}%" if parseable else f"{'-':>9}"))
+    rows, parsed, parseable, correct, misparsed = totals
+    print(f"Parsed {100*parsed/rows:.1f}% of rows; {100*correct/parseable:.1f}% of the {parseable} well formed rows came out correct, "
+          f"{misparsed} of the {rows - parseable} malformed rows were parsed anyway.")
+    print(f"Normalized {len(batch)} replies in {seconds:.3f}s: {len(batch)/seconds:,.0f} replies/s, {5*len(batch)/seconds:,.0f} Q/A pairs/s.")
+    if correct != parseable or misparsed:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,191 @@
+"""
+Local stand-in for the OpenAI chat completions API, for benchmarking without network access.
+
+Replies follow the formats the app asks for (one '- $amount | Question : Answer' line per
+requested row, or a JSON board), with configurable latency, rate-limit errors and malformed lines.
+
+    python -m benchmarks.mock_openai_server --port 8001 --latency 0.5 --rate-limit-rate 0.1
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+row_amounts = [200, 400, 600, 800, 1000]
+question_starts = ["This {category} fact is worth {amount} dollars", "What is the {category} item worth ${amount}?",
+                   "Who is the person behind {category} clue {amount}?", "In {category}, this answer is worth {amount}"]
+
+
+class MockSettings:
+    def __init__(self, latency=0.2, token_latency=0.0, rate_limit_rate=0.0, retry_after=0.1, malformed_rate=0.0, seed=None):
+        self.latency = latency
+        self.token_latency = token_latency
+        self.rate_limit_rate = rate_limit_rate
+        self.retry_after = retry_after
+        self.malformed_rate = malformed_rate
+        self.random = random.Random(seed)
+        self.requests = 0
+        self.rate_limited = 0
+        self._lock = threading.Lock()
+
+    def count_request(self):
+        with self._lock:
+            self.requests += 1
+            limited = self.random.random() < self.rate_limit_rate
+            self.rate_limited += limited
+            return limited
+
+    def malformed(self):
+        with self._lock:
+            return self.random.random() < self.malformed_rate
+
+
+def clue(settings, category, amount):
+    question = settings.random.choice(question_starts).format(category=category, amount=amount)
+    return question, f"{category} answer {amount}"
+
+def category_reply(settings, category, amounts):
+    lines = []
+    for amount in amounts:
+        question, answer = clue(settings, category, amount)
+        if settings.malformed():
+            lines.append(f"{amount}) {question} - {answer}")
+        else:
+            lines.append(f"- ${amount} | {question} : {answer}")
+    return "\n".join(lines)
+
+def board_reply(settings, cells_by_category):
+    board = {"categories": []}
+    for category, amounts in cells_by_category.items():
+        clues = []
+        for amount in amounts:
+            question, answer = clue(settings, category, amount)
+            if settings.malformed():
+                question = ""
+            clues.append({"value": amount, "question": question, "answer": answer})
+        board["categories"].append({"name": category, "clues": clues})
+    return json.dumps(board)
+
+def reply_for_prompt(settings, prompt):
+    """Answers the prompts built by trivia_generator and structured_board."""
+    if "JSON" in prompt:
+        repair = re.search(r"only these Jeopardy categories and dollar amounts: (.*?)\. Reply", prompt)
+        if repair:
+            cells_by_category = {}
+            for category, amounts in re.findall(r"category '(.*?)': ((?:'\$\d+'(?:, )?)+)", repair.group(1)):
+                cells_by_category[category] = [int(amount) for amount in re.findall(r"\$(\d+)", amounts)]
+        else:
+            names = re.search(r"The Jeopardy categories are (.*?) and the dollar amounts", prompt).group(1)
+            cells_by_category = {category: row_amounts for category in re.findall(r"'(.*?)'", names)}
+        return board_reply(settings, cells_by_category)
+
+    category = re.search(r"The Jeopardy category is '(.*?)' and", prompt)
+    category = category.group(1) if category else "Trivia"
+    only_rows = re.search(r"for only these dollar amounts: (.*?)\. Provide", prompt)
+    amounts = [int(amount) for amount in re.findall(r"\$(\d+)", only_rows.group(1))] if only_rows else row_amounts
+    return category_reply(settings, category, amounts)
+
+
+def make_handler(settings):
+    class MockOpenAIHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def send_json(self, status, body, headers=None):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.endswith("/models"):
+                self.send_json(200, {"object": "list", "data": [{"id": "gpt-3.5-turbo", "object": "model", "owned_by": "mock"}]})
+            else:
+                self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+
+        def do_POST(self):
+            body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if not self.path.endswith("/chat/completions"):
+                self.send_json(404, {"error": {"message": "Not found", "type": "invalid_request_error"}})
+                return
+            if settings.count_request():
+                self.send_json(429, {"error": {"message": "Rate limit reached (mock)", "type": "requests", "code": "rate_limit_exceeded"}},
+                               headers={"Retry-After": str(settings.retry_after)})
+                return
+
+            prompt = body["messages"][-1]["content"]
+            content = reply_for_prompt(settings, prompt)
+            prompt_tokens = sum(len(message["content"].split()) for message in body["messages"])
+            completion_tokens = len(content.split())
+            time.sleep(settings.latency)
+            if body.get("stream"):
+                self.stream_reply(body, content)
+                return
+            time.sleep(settings.token_latency * completion_tokens)
+            self.send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens, "total_tokens": prompt_tokens + completion_tokens},
+            })
+
+        def stream_reply(self, body, content):
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for piece in re.findall(r"\S+\s*", content):
+                chunk = {"id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()), "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {"content": piece}, "finish_reason": None}]}
+                self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.flush()
+                time.sleep(settings.token_latency)
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+            self.close_connection = True
+
+    return MockOpenAIHandler
+
+
+def start_server(settings, host="127.0.0.1", port=0):
+    """Starts the mock server on a background thread. returns: (server, api base url)"""
+    server = ThreadingHTTPServer((host, port), make_handler(settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, f"http://{host}:{server.server_address[1]}/v1"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run a local mock of the OpenAI chat completions API.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds before each reply starts")
+    parser.add_argument("--token-latency", type=float, default=0.0, help="extra seconds per completion token")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of requests answered with HTTP 429")
+    parser.add_argument("--retry-after", type=float, default=0.1, help="Retry-After seconds sent with 429 replies")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="fraction of clues returned in a broken format")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    settings = MockSettings(args.latency, args.token_latency, args.rate_limit_rate, args.retry_after, args.malformed_rate, args.seed)
+    server, api_base = start_server(settings, args.host, args.port)
+    print(f"Mock OpenAI API listening on {api_base} (set openai.api_base to use it)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
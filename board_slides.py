@@ -0,0 +1,117 @@
+from functools import lru_cache
+
+slide_markdown_open = r"""<section data-markdown="" data-separator-vertical="^--$" data-separator-notes="^Answer:" >
+<script type="text/template">
+## [Welcome to Chat GeoParT!](#/1)"""
+
+slide_markdown_close = r"""
+</script>
+</section>
+<script type="application/javascript">
+    function findLink(el) {
+        if (el.tagName == 'A' && el.href) {
+            return el;
+        } else if (el.parentElement) {
+            return findLink(el.parentElement);
+        } else {
+            return null;
+        }
+    };
+
+    function callback(e) {
+        const link = findLink(e.target);
+        if (link == null) { return; }
+        e.preventDefault();
+        // Do stuff here
+        link.classList.add("clicked");
+    };
+
+    // The component runs this script again whenever it rebuilds the deck, so only listen once
+    if (!window.chatGeoParTClickListener) {
+        window.chatGeoParTClickListener = callback;
+        document.addEventListener('click', callback, false);
+    }
+</script>
+"""
+
+board_background = r"""<!-- .slide: data-transition="fade" data-background-image="https://cdn.vox-cdn.com/thumbor/wEcBsqpKaKmrw6TWYNIDQfOPENk=/172x118:2400x1232/fit-in/1200x600/cdn.vox-cdn.com/uploads/chorus_asset/file/19577016/jeopardy_02.jpg" data-background-size="118%" data-background-position="20%" -->"""
+
+# One template per slide kind; slide numbers are reveal.js indices
+categories_intro_template = '\n---\n<!-- .slide: data-transition="zoom" -->\n ## [The categories are ... ](#/2) '
+category_slide_template = '\n---\n<!-- .slide: data-transition="zoom" -->\n ## [{category}](#/{next_slide})'
+board_slide_template = '\n---\n' + board_background + '\n|{header}\n|{alignment}{rows}\n'
+board_cell_template = '[${value}](#/{slide})|'
+played_board_cell_template = '<a class="clicked" href="#/{slide}">${value}</a>|'
+value_slide_template = '\n---\n<!-- .slide: data-transition="zoom" -->\n### ({category}) \n# [${value}](#/{slide}/1)'
+question_slide_template = '\n--\n<!-- .slide: data-transition="zoom" data-autoslide="{autoslide}" -->\n### [{question}](#/{slide}/2)\nAnswer:{answer}'
+answer_slide_template = '\n--\n<!-- .slide: data-transition="zoom-in fade-out" -->\n### [{answer}](#/{board_slide})'
+answer_file_template = "{category}\n\t[{value}]: Q:{question}\n\t\tA:{answer}\n\n"
+
+default_values = [200, 400, 600, 800, 1000]
+
+
+@lru_cache(maxsize=4096)
+def _value_slide(category, value, slide):
+    return value_slide_template.format(category=category, value=value, slide=slide)
+
+@lru_cache(maxsize=4096)
+def _question_slide(question, answer, slide, autoslide):
+    return question_slide_template.format(question=question, answer=answer, slide=slide, autoslide=autoslide)
+
+@lru_cache(maxsize=4096)
+def _answer_slide(answer, board_slide):
+    return answer_slide_template.format(answer=answer, board_slide=board_slide)
+
+@lru_cache(maxsize=128)
+def _render_board(categories, board, values, question_timer, num_intro_slides, open_cells, played_cells):
+    """Renders a board of hashable tuples, so identical boards are only rendered once."""
+    categories = [category.upper() for category in categories]
+    rows = len(values)
+    first_question = num_intro_slides + len(categories)
+    board_slide = first_question - 1
+
+    slides = [slide_markdown_open, categories_intro_template]
+    slides += [category_slide_template.format(category=category, next_slide=num_intro_slides + column) for column, category in enumerate(categories)]
+    board_rows = ("\n|" + "".join((played_board_cell_template if column*rows + row in played_cells else board_cell_template)
+                                  .format(value=values[row], slide=first_question + column*rows + row)
+                                  for column in range(len(categories))) for row in range(rows))
+    slides.append(board_slide_template.format(header="".join(f" {category} |" for category in categories),
+                                              alignment=":-:|" * len(categories), rows="".join(board_rows)))
+
+    answers = []
+    autoslide = question_timer * 1000
+    for column, category in enumerate(categories):
+        for row, value in enumerate(values):
+            question, answer = board[column][row][:2]
+            slide = first_question + column*rows + row
+            slides.append(_value_slide(category, value, slide))
+            if open_cells is None or column*rows + row in open_cells:
+                slides += [_question_slide(question, answer, slide, autoslide), _answer_slide(answer, board_slide)]
+            answers.append(answer_file_template.format(category=category, value=value, question=question, answer=answer))
+    slides.append(slide_markdown_close)
+    return "".join(slides), "".join(answers)
+
+
+def build_slide_markdown(categories, jeopardy_set, multiplier=1, question_timer=10, num_intro_slides=3, values=default_values, open_cells=None, played_cells=()):
+    """
+    Builds the reveal.js markdown for a board of any size and the matching answer sheet.
+    `jeopardy_set` holds one list of [question, answer] pairs per category, one pair per value.
+    With `open_cells` (cell numbers, see cell_at_slide) only those cells get their question and
+    answer slides; the others keep just their value slide, so slide numbers don't change.
+    `played_cells` are drawn on the board the way the slides' script marks clicked cells, so they
+    stay played when the deck is rebuilt.
+    Results are memoized on the board's content, and each slide separately, so changing the
+    multiplier or the timer only re-renders the slides that show it.
+    returns: (slide markdown, answer file text)
+    """
+    board = tuple(tuple(tuple(qa[:2]) for qa in column) for column in jeopardy_set)
+    values = tuple(value*multiplier for value in values)
+    open_cells = None if open_cells is None else frozenset(open_cells)
+    return _render_board(tuple(categories), board, values, question_timer, num_intro_slides, open_cells, frozenset(played_cells))
+
+def cell_at_slide(slide, number_of_categories, rows=len(default_values), num_intro_slides=3):
+    """returns: the number (column*rows + row) of the cell whose value slide is `slide`, or None"""
+    cell = slide - num_intro_slides - number_of_categories
+    if 0 <= cell < number_of_categories*rows:
+        return cell
+    return None
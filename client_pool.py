@@ -0,0 +1,77 @@
+import time
+import hashlib
+import threading
+
+from lazy_imports import lazy_module
+
+openai = lazy_module("openai")
+requests = lazy_module("requests")
+
+default_validation_ttl = 600
+
+
+def make_pooled_session(pool_maxsize=32):
+    """
+    Keep-alive HTTP session for the openai module, sized for concurrent generation.
+    Credentials travel as per-request headers, so one pool serves every key.
+    """
+    from openai.api_requestor import MAX_CONNECTION_RETRIES
+    session = requests.Session()
+    adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize, max_retries=MAX_CONNECTION_RETRIES)
+    session.mount("https://", adapter)
+    return session
+
+
+class OpenAIClient:
+    """
+    One set of OpenAI credentials. Requests pass the key and organization explicitly,
+    so sessions using different credentials never touch the global `openai.api_key`.
+    """
+
+    def __init__(self, api_key, organization, validation_ttl=default_validation_ttl):
+        self.api_key = api_key
+        self.organization = organization
+        self.validation_ttl = validation_ttl
+        self._validated_at = None
+        self._valid = False
+        self._lock = threading.Lock()
+
+    def chat_completion(self, **kwargs):
+        return openai.ChatCompletion.create(api_key=self.api_key, organization=self.organization, **kwargs)
+
+    def validate(self):
+        """
+        returns: whether the credentials work, checking with the API at most once per `validation_ttl`
+        seconds, or None if the API couldn't tell (network errors, rate limits, ...); that isn't cached
+        """
+        with self._lock:
+            if self._validated_at is not None and time.monotonic() - self._validated_at < self.validation_ttl:
+                return self._valid
+            try:
+                openai.Model.list(api_key=self.api_key, organization=self.organization)
+                self._valid = True
+            except (openai.error.AuthenticationError, openai.error.PermissionError):
+                self._valid = False
+            except openai.error.OpenAIError:
+                # Says nothing about the credentials, so the next rerun asks again
+                return None
+            self._validated_at = time.monotonic()
+            return self._valid
+
+
+class ClientRegistry:
+    """Process-wide registry handing out one OpenAIClient per set of credentials."""
+
+    def __init__(self, validation_ttl=default_validation_ttl, pool_maxsize=32):
+        self.validation_ttl = validation_ttl
+        self._clients = {}
+        self._lock = threading.Lock()
+        openai.requestssession = make_pooled_session(pool_maxsize)
+
+    def get_client(self, api_key, organization):
+        # Index by a digest so the registry never holds keys as lookup values
+        client_id = hashlib.sha256(f"{api_key}\n{organization}".encode()).hexdigest()
+        with self._lock:
+            if client_id not in self._clients:
+                self._clients[client_id] = OpenAIClient(api_key, organization, self.validation_ttl)
+            return self._clients[client_id]
@@ -0,0 +1,69 @@
+import hashlib
+import threading
+
+from io import BytesIO
+from zipfile import ZipFile
+from game_format import dumps_game, render_game
+
+
+def create_download_zip_file(markdown_file_string, css_file_string, answer_file_string, player_files, game_file_string=None):
+    """
+    player_files: {file name: source} of the player app's modules
+    game_file_string: a structured game, saved instead of the slide markdown when given
+    returns: zip archive
+    """
+    archive = BytesIO()
+
+    with ZipFile(archive, 'w') as zip_archive:
+        # Create the game files and the player on zip archive
+        with zip_archive.open('ChatGeoParT/style.css', 'w') as file1:
+            file1.write(css_file_string.encode())
+        
+        if game_file_string is not None:
+            with zip_archive.open('ChatGeoParT/games/game.json', 'w') as file2:
+                file2.write(game_file_string.encode())
+        else:
+            with zip_archive.open('ChatGeoParT/games/game.md', 'w') as file2:
+                file2.write(markdown_file_string.encode())
+
+        with zip_archive.open('ChatGeoParT/games/answers.txt', 'w') as file3:
+            file3.write(answer_file_string.encode())
+
+        for file_name, source in player_files.items():
+            with zip_archive.open('ChatGeoParT/' + file_name, 'w') as file4:
+                file4.write(source.encode())
+
+    return archive
+
+
+class GameExport:
+    """
+    One session's download archive, built in memory only when its contents change.
+    The archive is keyed on a hash of (markdown, css, answers), so reruns that don't
+    touch the game reuse the bytes built last time and nothing is written to disk.
+    """
+
+    def __init__(self, player_files):
+        self.player_files = player_files
+        self._content_hash = None
+        self._archive = None
+        self._lock = threading.Lock()
+
+    def archive_bytes(self, game, markdown_file_string, css_file_string, answer_file_string):
+        """returns: the zip archive as bytes"""
+        content_hash = hashlib.sha256("\0".join((markdown_file_string, css_file_string, answer_file_string)).encode()).hexdigest()
+        with self._lock:
+            if content_hash != self._content_hash:
+                game_file_string = None
+                if game is not None and render_game(game)[0] == markdown_file_string:
+                    game_file_string = dumps_game(game)
+                download_file = create_download_zip_file(markdown_file_string, css_file_string, answer_file_string, self.player_files, game_file_string)
+                self._archive = download_file.getvalue()
+                self._content_hash = content_hash
+                download_file.close()
+            return self._archive
+
+    def footprint(self):
+        """returns: size in bytes of the archive kept from the last download"""
+        with self._lock:
+            return len(self._archive) if self._archive is not None else 0
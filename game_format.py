@@ -0,0 +1,113 @@
+import re
+import json
+import copy
+
+from board_slides import build_slide_markdown, cell_at_slide, default_values
+
+game_format_name = "chatgeopart-game"
+game_format_version = 1
+game_file_extension = ".json"
+markdown_file_extension = ".md"
+
+slide_separator_pattern = re.compile(r"(\n---\n|\n--\n)")
+question_slide_pattern = re.compile(r'<!-- \.slide: data-transition="zoom" data-autoslide="\d+" -->\n### \[(.*)\]\(#/(\d+)/2\)\nAnswer:(.*)', re.DOTALL)
+answer_slide_pattern = re.compile(r'<!-- \.slide: data-transition="zoom-in fade-out" -->\n### \[(.*)\]\(#/\d+\)', re.DOTALL)
+
+
+class GameFormatError(ValueError):
+    """Raised when a game file isn't a valid structured game."""
+
+
+def make_game(categories, jeopardy_set, values=default_values, multiplier=1, question_timer=10, num_intro_slides=3):
+    """returns: a structured game; `jeopardy_set` holds one list of [question, answer] pairs per category"""
+    return {
+        "format": game_format_name,
+        "version": game_format_version,
+        "categories": list(categories),
+        "values": list(values),
+        "clues": [[list(qa[:2]) for qa in column] for column in jeopardy_set],
+        "settings": {"multiplier": multiplier, "question_timer": question_timer, "num_intro_slides": num_intro_slides},
+    }
+
+def dumps_game(game):
+    return json.dumps(game, separators=(",", ":"), ensure_ascii=False)
+
+def loads_game(text):
+    """returns: the structured game in `text`, raises GameFormatError if it isn't one"""
+    try:
+        game = json.loads(text)
+    except ValueError as e:
+        raise GameFormatError(f"Game file is not valid JSON: {e}")
+    if not isinstance(game, dict) or game.get("format") != game_format_name:
+        raise GameFormatError("Game file is not a Chat GeoParT game.")
+    if game.get("version", 0) > game_format_version:
+        raise GameFormatError(f"Game file version {game['version']} is newer than this app supports.")
+    categories, values, clues = game.get("categories"), game.get("values"), game.get("clues")
+    if not categories or not values or not isinstance(clues, list) or len(clues) != len(categories) \
+            or any(len(column) != len(values) or any(len(qa) < 2 for qa in column) for column in clues):
+        raise GameFormatError("Game file needs one question and answer per category and value.")
+    return game
+
+def render_game(game, open_cells=None, played_cells=(), **settings):
+    """
+    Renders a structured game's slides and answer sheet; keyword arguments override its settings.
+    With `open_cells` only those cells' question slides are included, and `played_cells` are
+    shown as played on the board (see build_slide_markdown).
+    returns: (slide markdown, answer file text)
+    """
+    settings = dict(game.get("settings", {}), **settings)
+    return build_slide_markdown(game["categories"], game["clues"], settings.get("multiplier", 1), settings.get("question_timer", 10),
+                                settings.get("num_intro_slides", 3), game["values"], open_cells, played_cells)
+
+def patch_game(game, markdown):
+    """
+    Applies edits made to a game's rendered slides back to the game, when they only change
+    questions and answers.
+    returns: the edited game, or None if the slides were changed in any other way
+    """
+    old_slides = slide_separator_pattern.split(render_game(game)[0])
+    new_slides = slide_separator_pattern.split(markdown)
+    if len(old_slides) != len(new_slides):
+        return None
+    settings = game.get("settings", {})
+    rows = len(game["values"])
+    patched = copy.deepcopy(game)
+    cell = None
+    for old_slide, new_slide in zip(old_slides, new_slides):
+        old_question = question_slide_pattern.fullmatch(old_slide)
+        if old_question:
+            cell = cell_at_slide(int(old_question.group(2)), len(game["categories"]), rows, settings.get("num_intro_slides", 3))
+        if old_slide == new_slide:
+            continue
+        new_question = question_slide_pattern.fullmatch(new_slide)
+        new_answer = answer_slide_pattern.fullmatch(new_slide)
+        if cell is None:
+            return None
+        qa = patched["clues"][cell // rows][cell % rows]
+        if old_question and new_question:
+            qa[0], qa[1] = new_question.group(1), new_question.group(3)
+        elif answer_slide_pattern.fullmatch(old_slide) and new_answer:
+            qa[1] = new_answer.group(1)
+        else:
+            return None
+    # Edits the game can't represent exactly, e.g. different answers on the two slides, keep the markdown instead
+    if render_game(patched)[0] != markdown:
+        return None
+    return patched
+
+def game_markdown(file_name, text):
+    """returns: the slide markdown of a game file, rendering structured games and passing old .md games through"""
+    if file_name.endswith(game_file_extension):
+        return render_game(loads_game(text))[0]
+    return text
+
+def game_clues(file_name, text):
+    """returns: every [question, answer] of a game file, read from the slides of old .md games"""
+    if file_name.endswith(game_file_extension):
+        return [qa[:2] for column in loads_game(text)["clues"] for qa in column]
+    clues = []
+    for slide in slide_separator_pattern.split(text):
+        question = question_slide_pattern.fullmatch(slide)
+        if question:
+            clues.append([question.group(1), question.group(3).strip()])
+    return clues
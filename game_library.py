@@ -0,0 +1,226 @@
+import os
+import re
+import json
+import time
+import threading
+
+from collections import OrderedDict
+from game_format import GameFormatError, game_file_extension, markdown_file_extension, loads_game, game_markdown, game_clues
+
+default_games_dir = "games"
+default_manifest_path = "game_library.json"
+game_extensions = (markdown_file_extension, game_file_extension)
+
+board_header_pattern = re.compile(r"^\|((?: [^|\n]+ \|)+)[ \t]*$", re.MULTILINE)
+
+
+def board_categories(markdown):
+    """returns: the category names in the header row of a game's board slide"""
+    header = board_header_pattern.search(markdown)
+    if not header:
+        return []
+    return [category.strip() for category in header.group(1).split("|") if category.strip()]
+
+
+class GameLibrary:
+    """
+    Index of the games in `games_dir` for the player. The listing is only rebuilt when the
+    directory's mtime changes (games added, removed or renamed), or every `rescan_interval`
+    seconds to pick up games edited in place; unchanged files keep their index entry by mtime
+    and size. The index is saved to `manifest_path` so a fresh process doesn't re-read every game.
+    Structured .json games and old .md games are both listed. Rendered slides are cached by
+    path and mtime for the last `max_cached_games` games opened. With a `question_index`
+    (see question_index.py) the games' clues are kept in it, under each game's path, so
+    `repeats` can find clues a game shares with the others. Listing games never touches the
+    question index; it is brought up to date by `sync_index`, when repeats are first looked up.
+    """
+
+    def __init__(self, games_dir=default_games_dir, manifest_path=default_manifest_path, rescan_interval=30, max_cached_games=32, question_index=None):
+        self.games_dir = games_dir
+        self.manifest_path = manifest_path
+        self.rescan_interval = rescan_interval
+        self.max_cached_games = max_cached_games
+        self.question_index = question_index
+        self._games = {}
+        self._dir_mtime = None
+        self._scanned_at = 0.0
+        self._contents = OrderedDict()
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._load_manifest()
+
+    def _load_manifest(self):
+        if not self.manifest_path or not os.path.isfile(self.manifest_path):
+            return
+        try:
+            with open(self.manifest_path, "r") as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return
+        if manifest.get("games_dir") == os.path.abspath(self.games_dir):
+            self._games = manifest.get("games", {})
+
+    def _save_manifest(self):
+        if not self.manifest_path:
+            return
+        manifest = {"games_dir": os.path.abspath(self.games_dir), "games": self._games}
+        temporary_path = self.manifest_path + ".tmp"
+        try:
+            with open(temporary_path, "w") as f:
+                json.dump(manifest, f)
+            os.replace(temporary_path, self.manifest_path)
+        except OSError:
+            pass
+
+    def _source(self, name):
+        """returns: the question index source of game file `name`"""
+        return os.path.join(os.path.abspath(self.games_dir), name)
+
+    def _index_game(self, path):
+        """returns: the index entry of a game file, or None if it isn't a game"""
+        with open(path, "r") as f:
+            text = f.read()
+        title = os.path.splitext(os.path.basename(path))[0]
+        if path.endswith(game_file_extension):
+            try:
+                game = {"title": title, "categories": loads_game(text)["categories"]}
+            except GameFormatError:
+                return None
+        else:
+            game = {"title": title, "categories": board_categories(text)}
+        return game
+
+    def _scan(self):
+        games = {}
+        with os.scandir(self.games_dir) as entries:
+            for entry in entries:
+                if not entry.is_file() or not entry.name.endswith(game_extensions):
+                    continue
+                stat = entry.stat()
+                game = self._games.get(entry.name)
+                if game is None or game["mtime"] != stat.st_mtime_ns or game["size"] != stat.st_size:
+                    game = self._index_game(entry.path)
+                    if game is None:
+                        continue
+                    game.update(mtime=stat.st_mtime_ns, size=stat.st_size)
+                games[entry.name] = game
+        changed = games != self._games
+        self._games = games
+        if changed:
+            self._save_manifest()
+
+    def refresh(self):
+        """Rescans the games directory if it changed. returns: whether it was rescanned"""
+        with self._lock:
+            try:
+                dir_mtime = os.stat(self.games_dir).st_mtime_ns
+            except FileNotFoundError:
+                self._games, self._dir_mtime = {}, None
+                return False
+            if dir_mtime == self._dir_mtime and time.monotonic() - self._scanned_at < self.rescan_interval:
+                return False
+            self._scan()
+            self._dir_mtime = dir_mtime
+            self._scanned_at = time.monotonic()
+            return True
+
+    def search(self, query=""):
+        """returns: file names of the games whose title or a category contains `query`, sorted by title"""
+        self.refresh()
+        query = query.strip().lower()
+        with self._lock:
+            games = sorted(self._games.items(), key=lambda item: item[1]["title"].lower())
+        if query:
+            games = [(name, game) for name, game in games
+                     if query in game["title"].lower() or any(query in category.lower() for category in game["categories"])]
+        return [name for name, game in games]
+
+    def title(self, name):
+        with self._lock:
+            game = self._games.get(name)
+        return game["title"] if game else os.path.splitext(name)[0]
+
+    def categories(self, name):
+        with self._lock:
+            game = self._games.get(name)
+        return game["categories"] if game else []
+
+    def sync_index(self):
+        """
+        Stores the clues of games added or changed since they were last indexed in the question index,
+        and forgets those of deleted games, in one transaction. The library lock is only held to read
+        the listing and to mark the games indexed, so listing games isn't held up meanwhile.
+        returns: how many games were indexed
+        """
+        if self.question_index is None:
+            return 0
+        self.refresh()
+        with self._index_lock:
+            with self._lock:
+                listed = {name: game["mtime"] for name, game in self._games.items()}
+                marked = {name for name, game in self._games.items() if game.get("indexed") == game["mtime"]}
+            # Games the question index doesn't know are indexed again even if the manifest marks them
+            indexed_sources = self.question_index.sources()
+            source_prefix = self._source("")
+            clues, mtimes = {}, {}
+            for name, mtime in listed.items():
+                if name in marked and self._source(name) in indexed_sources:
+                    continue
+                path = os.path.join(self.games_dir, name)
+                try:
+                    mtime = os.stat(path).st_mtime_ns
+                    with open(path, "r") as f:
+                        clues[self._source(name)] = game_clues(name, f.read())
+                    mtimes[name] = mtime
+                except (OSError, GameFormatError):
+                    continue
+            # Forget the clues of games that were deleted, even while no player was running
+            removed = {source for source in indexed_sources - {self._source(name) for name in listed} if source.startswith(source_prefix)}
+            if clues or removed:
+                self.question_index.replace_sources(clues, removed)
+            with self._lock:
+                for name, mtime in mtimes.items():
+                    game = self._games.get(name)
+                    # A game edited while it was read keeps its old mark and is read again next time
+                    if game is not None and game["mtime"] == mtime == listed[name]:
+                        game["indexed"] = mtime
+                if mtimes:
+                    self._save_manifest()
+        return len(clues)
+
+    def repeats(self, name):
+        """
+        returns: (question, answer, match) for every clue of game file `name` that is also in another
+        game of the library, `match` being what QuestionIndex.find returns; empty without a question index
+        """
+        if self.question_index is None:
+            return []
+        self.sync_index()
+        with open(os.path.join(self.games_dir, name), "r") as f:
+            clues = game_clues(name, f.read())
+        source_prefix = self._source("")
+        repeats = []
+        for question, answer in clues:
+            match = self.question_index.find(question, answer, exclude_source=self._source(name), source_prefix=source_prefix)
+            if match:
+                repeats.append((question, answer, match))
+        return repeats
+
+    def read_game(self, name):
+        """returns: the slide markdown of game file `name`, read and rendered only when the file changed"""
+        path = os.path.join(self.games_dir, name)
+        mtime = os.stat(path).st_mtime_ns
+        with self._lock:
+            cached = self._contents.get(name)
+            if cached and cached[0] == mtime:
+                self._contents.move_to_end(name)
+                return cached[1]
+        with open(path, "r") as f:
+            markdown = game_markdown(name, f.read())
+        with self._lock:
+            self._contents[name] = (mtime, markdown)
+            self._contents.move_to_end(name)
+            while len(self._contents) > self.max_cached_games:
+                self._contents.popitem(last=False)
+        return markdown
+
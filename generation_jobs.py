@@ -0,0 +1,171 @@
+import time
+import uuid
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from trivia_generator import GenerationStats, generate_jeopardy_set, stream_jeopardy_set, is_repeat, is_complete
+from structured_board import generate_structured_board
+
+queued, running, done, failed = "queued", "running", "done", "failed"
+
+
+class JobQueueFullError(RuntimeError):
+    """Raised when the server already has as many generation jobs waiting as it accepts."""
+
+
+class GenerationJob:
+    """
+    One board being generated on a worker thread. Workers only write to the job, never to
+    Streamlit, and sessions read it through `snapshot` while it runs.
+    """
+
+    def __init__(self, categories, rows=5, profiler=None):
+        self.job_id = uuid.uuid4().hex
+        self.categories = list(categories)
+        self.status = queued
+        self.submitted = time.time()
+        self.started = None
+        self.finished = None
+        self.stats = GenerationStats(profiler)
+        self.cells = [[None]*rows for category in self.categories]
+        self.result = None
+        self.error = None
+        self._lock = threading.Lock()
+
+    def set_cell(self, column, row, qa):
+        with self._lock:
+            self.cells[column][row] = qa
+
+    def set_column(self, column, qa_array):
+        with self._lock:
+            for row, qa in enumerate(qa_array[:len(self.cells[column])]):
+                if qa[0] != 0:
+                    self.cells[column][row] = qa
+
+    def snapshot(self):
+        """returns: a consistent copy of the job's progress, safe to read from the script thread"""
+        with self._lock:
+            return {
+                "job_id": self.job_id,
+                "status": self.status,
+                "categories": self.categories,
+                "cells": [list(column) for column in self.cells],
+                "submitted": self.submitted,
+                "started": self.started,
+                "finished": self.finished,
+                "error": self.error,
+            }
+
+
+class JobManager:
+    """
+    Process-wide pool running generation jobs in the background, so a board keeps generating
+    through reruns, widget changes and reconnects. At most `max_workers` boards generate at once
+    and at most `max_queued` wait behind them; finished jobs are kept for `finished_ttl` seconds
+    for their session to collect. With a `profiler`, every job's API requests are timed there as
+    they finish. When a job finishes its requests are added to `telemetry`, and a complete board's
+    questions to `question_index`, whether or not a session ever collects the job.
+    """
+
+    def __init__(self, max_workers=4, max_queued=32, finished_ttl=3600, profiler=None, telemetry=None, question_index=None):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.finished_ttl = finished_ttl
+        self.profiler = profiler
+        self.telemetry = telemetry
+        self.question_index = question_index
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="generation")
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def submit(self, categories, work):
+        """
+        Queues `work(job)`, whose return value becomes the job's result.
+        returns: the new GenerationJob
+        """
+        self._forget_old_jobs()
+        with self._lock:
+            if sum(job.status == queued for job in self._jobs.values()) >= self.max_queued:
+                raise JobQueueFullError("Too many games are being generated right now, please try again in a minute.")
+            job = GenerationJob(categories, profiler=self.profiler)
+            self._jobs[job.job_id] = job
+        self._executor.submit(self._run, job, work)
+        return job
+
+    def _run(self, job, work):
+        with job._lock:
+            job.status = running
+            job.started = time.time()
+        try:
+            result = work(job)
+            status, error = done, None
+        except Exception as e:
+            result, status, error = None, failed, str(e) or type(e).__name__
+        try:
+            self._record(job, result)
+        except Exception as e:
+            job.stats.add_error(f"ERROR! Couldn't record the finished game: {e}")
+        with job._lock:
+            job.result = result
+            job.error = error
+            job.status = status
+            job.finished = time.time()
+
+    def _record(self, job, result):
+        if self.telemetry is not None:
+            self.telemetry.add(job.stats)
+        # Later boards shouldn't repeat this one's questions, whichever session generates them
+        if self.question_index is not None and result and all(is_complete(qa_array) for qa_array in result):
+            self.question_index.replace_source(f"generated:{job.job_id}", [qa for qa_array in result for qa in qa_array])
+
+    def get(self, job_id):
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def queue_position(self, job):
+        """returns: how many jobs will start before `job`, 0 once it runs"""
+        with self._lock:
+            if job.status != queued:
+                return 0
+            return sum(other.status == queued and other.submitted < job.submitted for other in self._jobs.values()) + 1
+
+    def _forget_old_jobs(self):
+        now = time.time()
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished is not None and now - job.finished > self.finished_ttl:
+                    del self._jobs[job_id]
+
+
+def generate_board(job, banked_sets, whole_board, generation, cache=None, context=None, progressive=True, concurrent=True, single_flight=None, question_index=None):
+    """
+    Generates every category of `job` not found in `banked_sets`, filling in the job's cells as it goes.
+    `generation` holds the limiter, retry_policy and client passed to each request,
+    `single_flight` lets categories already being generated for another session share that request,
+    and questions repeating one in `question_index` or elsewhere on the board are requested again.
+    returns: one qa array per category, in the job's category order
+    """
+    categories_to_generate = [category for category in job.categories if category not in banked_sets]
+    columns = {category: column for column, category in enumerate(job.categories)}
+    duplicates = question_index.board() if question_index else None
+    for category, qa_array in banked_sets.items():
+        if category in columns:
+            job.set_column(columns[category], qa_array)
+            # Banked questions are on the board already, so generated ones mustn't repeat them
+            for qa in qa_array:
+                is_repeat(qa, duplicates)
+
+    generated_sets = []
+    if categories_to_generate and whole_board:
+        generated_sets = generate_structured_board(categories_to_generate, stats=job.stats, duplicates=duplicates, **generation)
+    elif categories_to_generate and progressive:
+        generated_sets = [[[0],[0],[0],[0],[0]] for category in categories_to_generate]
+        for column, row, qa in stream_jeopardy_set(categories_to_generate, stats=job.stats, context=context, cache=cache, single_flight=single_flight, duplicates=duplicates, **generation):
+            generated_sets[column][row] = qa
+            job.set_cell(columns[categories_to_generate[column]], row, qa)
+    elif categories_to_generate:
+        generated_sets = generate_jeopardy_set(categories_to_generate, stats=job.stats, context=context, cache=cache, concurrent=concurrent, single_flight=single_flight, duplicates=duplicates, **generation)
+    generated_sets = dict(zip(categories_to_generate, generated_sets))
+    for category in categories_to_generate:
+        job.set_column(columns[category], generated_sets[category])
+    return [banked_sets[category] if category in banked_sets else generated_sets[category] for category in job.categories]
@@ -0,0 +1,46 @@
+import sys
+import time
+import importlib
+import threading
+
+# Seconds each lazily imported module took to load, in the order they were first used
+import_timings = {}
+
+
+class LazyModule:
+    """
+    Stand-in for a module that is only imported the first time one of its attributes is used,
+    so heavy dependencies like openai don't slow down a cold start of the app. Safe to first
+    use from several threads at once.
+    """
+
+    def __init__(self, name):
+        object.__setattr__(self, "_name", name)
+        object.__setattr__(self, "_module", None)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def _load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    timer_start = time.perf_counter()
+                    module = importlib.import_module(self._name)
+                    import_timings[self._name] = time.perf_counter() - timer_start
+                    object.__setattr__(self, "_module", module)
+        return self._module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._load(), name, value)
+
+    def __repr__(self):
+        state = "loaded" if self._module is not None else "not loaded yet"
+        return f"<lazy module '{self._name}' ({state})>"
+
+
+def lazy_module(name):
+    """returns: `name` itself if it's already imported, otherwise a LazyModule for it"""
+    module = sys.modules.get(name)
+    return module if module is not None else LazyModule(name)
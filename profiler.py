@@ -0,0 +1,155 @@
+import json
+import time
+import threading
+import tracemalloc
+
+from collections import deque
+from telemetry import percentile
+
+metric_prefix = "chatgeopart"
+
+
+class SpanStats:
+    """Durations, and allocations when tracked, recorded under one span name."""
+
+    def __init__(self, max_samples):
+        self.count = 0
+        self.total_seconds = 0.0
+        self.max_seconds = 0.0
+        self.allocated_bytes = 0
+        self.peak_bytes = 0
+        self.samples = deque(maxlen=max_samples)
+
+    def add(self, seconds, allocated_bytes=None, peak_bytes=None):
+        self.count += 1
+        self.total_seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.samples.append(seconds)
+        if allocated_bytes is not None:
+            self.allocated_bytes += allocated_bytes
+            self.peak_bytes = max(self.peak_bytes, peak_bytes)
+
+
+class Profiler:
+    """
+    Aggregates named timing spans for the whole process, e.g. one per section of a Streamlit rerun
+    and one per API request. Counts and totals cover everything recorded; percentiles cover the
+    last `max_samples` spans of each name. With `track_allocations` on, tracemalloc also records
+    how much memory each span allocated. tracemalloc traces the whole process, so spans running at
+    the same time in other sessions' threads add to each other's allocations.
+    """
+
+    def __init__(self, max_samples=1000):
+        self.max_samples = max_samples
+        self.started = time.time()
+        self._spans = {}
+        self._lock = threading.Lock()
+
+    @property
+    def track_allocations(self):
+        return tracemalloc.is_tracing()
+
+    @track_allocations.setter
+    def track_allocations(self, enabled):
+        if enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        elif not enabled and tracemalloc.is_tracing():
+            tracemalloc.stop()
+
+    def record(self, name, seconds, allocated_bytes=None, peak_bytes=None):
+        with self._lock:
+            if name not in self._spans:
+                self._spans[name] = SpanStats(self.max_samples)
+            self._spans[name].add(seconds, allocated_bytes, peak_bytes)
+
+    def rerun(self, name="rerun"):
+        """returns: a RerunTimer timing one script run section by section"""
+        return RerunTimer(self, name)
+
+    def summary(self):
+        """returns: one dict per span name, sorted by name"""
+        with self._lock:
+            spans = [(name, stats.count, stats.total_seconds, stats.max_seconds, stats.allocated_bytes, stats.peak_bytes, sorted(stats.samples))
+                     for name, stats in self._spans.items()]
+        return [{
+            "span": name,
+            "count": count,
+            "total_seconds": total_seconds,
+            "mean_seconds": total_seconds / count,
+            "p50_seconds": percentile(samples, 0.5),
+            "p95_seconds": percentile(samples, 0.95),
+            "max_seconds": max_seconds,
+            "allocated_bytes": allocated_bytes,
+            "peak_bytes": peak_bytes,
+        } for name, count, total_seconds, max_seconds, allocated_bytes, peak_bytes, samples in sorted(spans)]
+
+    def to_jsonl(self):
+        """returns: the summary as JSON lines, one per span name"""
+        now = time.time()
+        return "".join(json.dumps(dict(span, time=now)) + "\n" for span in self.summary())
+
+    def to_prometheus(self):
+        """returns: the summary in the Prometheus text exposition format"""
+        lines = [f"# HELP {metric_prefix}_span_seconds Time spent in each profiled span.",
+                 f"# TYPE {metric_prefix}_span_seconds summary"]
+        summary = self.summary()
+        for span in summary:
+            label = span["span"].replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{metric_prefix}_span_seconds{{span="{label}",quantile="0.5"}} {span["p50_seconds"]}')
+            lines.append(f'{metric_prefix}_span_seconds{{span="{label}",quantile="0.95"}} {span["p95_seconds"]}')
+            lines.append(f'{metric_prefix}_span_seconds_sum{{span="{label}"}} {span["total_seconds"]}')
+            lines.append(f'{metric_prefix}_span_seconds_count{{span="{label}"}} {span["count"]}')
+        lines += [f"# HELP {metric_prefix}_span_allocated_bytes_total Memory allocated in each span while allocation tracking was on.",
+                  f"# TYPE {metric_prefix}_span_allocated_bytes_total counter"]
+        for span in summary:
+            label = span["span"].replace("\\", "\\\\").replace('"', '\\"')
+            lines.append(f'{metric_prefix}_span_allocated_bytes_total{{span="{label}"}} {span["allocated_bytes"]}')
+        return "\n".join(lines) + "\n"
+
+
+class SpanTimer:
+    """One running span; stopping it records it in the profiler."""
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.tracing = tracemalloc.is_tracing()
+        if self.tracing:
+            tracemalloc.reset_peak()
+            self.start_bytes = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+
+    def stop(self):
+        seconds = time.perf_counter() - self.start
+        allocated_bytes = peak_bytes = None
+        # Allocation tracking might have been switched on or off while the span ran
+        if self.tracing and tracemalloc.is_tracing():
+            current_bytes, traced_peak = tracemalloc.get_traced_memory()
+            allocated_bytes = max(0, current_bytes - self.start_bytes)
+            peak_bytes = max(0, traced_peak - self.start_bytes)
+        self.profiler.record(self.name, seconds, allocated_bytes, peak_bytes)
+
+
+class RerunTimer:
+    """
+    Times one Streamlit script run as a sequence of sections without re-indenting the script:
+    each call to `section` ends the previous section. `finish` ends the last one and records the
+    whole run as `name`. Runs cut short by st.rerun() or st.stop() aren't recorded as a whole.
+    """
+
+    def __init__(self, profiler, name="rerun"):
+        self.profiler = profiler
+        self.name = name
+        self.start = time.perf_counter()
+        self.current = None
+
+    def section(self, name):
+        if self.current is not None:
+            self.current.stop()
+        self.current = SpanTimer(self.profiler, f"{self.name}.{name}")
+
+    def finish(self):
+        if self.current is not None:
+            self.current.stop()
+            self.current = None
+        self.profiler.record(self.name, time.perf_counter() - self.start)
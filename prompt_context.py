@@ -0,0 +1,63 @@
+import threading
+
+from collections import deque
+from tokenizer import num_tokens_from_messages
+
+system_message = "You are a helpful trivia game creation assistant."
+
+# Context window of each chat model, in tokens
+model_context_limits = {
+    "gpt-3.5-turbo": 4096,
+    "gpt-3.5-turbo-16k": 16384,
+    "gpt-4": 8192,
+    "gpt-4-32k": 32768,
+}
+default_context_limit = 4096
+
+
+class ContextBudgetError(ValueError):
+    """Raised when a prompt can't fit in the model's context window."""
+
+
+class PromptContext:
+    """
+    Builds the message list sent with each request: the system message, an optional bounded
+    window of previous exchanges and the new prompt, trimmed to fit the model's context limit.
+    With the default history_window=0 every request is a fresh, minimal prompt.
+    """
+
+    def __init__(self, history_window=0, completion_tokens=350, system=system_message):
+        self.history_window = history_window
+        self.completion_tokens = completion_tokens
+        self.system = system
+        self._history = deque(maxlen=max(history_window, 1))
+        self._lock = threading.Lock()
+
+    def token_budget(self, model):
+        """Prompt tokens available once room for the reply is reserved."""
+        return model_context_limits.get(model, default_context_limit) - self.completion_tokens
+
+    def build_messages(self, prompt, model="gpt-3.5-turbo"):
+        messages = [{"role": "system", "content": self.system},
+                    {"role": "user", "content": prompt}]
+        budget = self.token_budget(model)
+        if num_tokens_from_messages(messages, model=model) > budget:
+            raise ContextBudgetError(f"Prompt needs more than the {budget} tokens available for {model}.")
+
+        if self.history_window:
+            with self._lock:
+                history = list(self._history)
+            # Keep the most recent exchanges that still fit in the budget
+            for user_content, assistant_content in reversed(history):
+                exchange = [{"role": "user", "content": user_content},
+                            {"role": "assistant", "content": assistant_content}]
+                if num_tokens_from_messages(messages + exchange, model=model) > budget:
+                    break
+                messages[1:1] = exchange
+        return messages
+
+    def record(self, prompt, reply):
+        """Adds a finished exchange to the history window."""
+        if self.history_window:
+            with self._lock:
+                self._history.append((prompt, reply))
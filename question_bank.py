@@ -0,0 +1,121 @@
+import sys
+import time
+import sqlite3
+import argparse
+
+from contextlib import contextmanager
+from rate_limiter import TokenBucketLimiter
+from retry_policy import RetryPolicy
+from response_cache import normalize_category
+from trivia_generator import GenerationStats, generate_jeopardy_set, is_complete
+
+default_bank_path = "question_bank.sqlite3"
+
+
+class QuestionBank:
+    """
+    Local store of pre-generated questions, indexed by category and difficulty row
+    (row 0 is the $200 question), so boards can be assembled without calling the API.
+    """
+
+    def __init__(self, path=default_bank_path, rows=5):
+        self.path = path
+        self.rows = rows
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS questions ("
+                               "id INTEGER PRIMARY KEY AUTOINCREMENT, category TEXT NOT NULL, name TEXT NOT NULL, "
+                               "row INTEGER NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL, created REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS questions_category_row ON questions (category, row)")
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def add_category(self, category, trivia_questions):
+        """Stores every complete row of a generated category."""
+        now = time.time()
+        rows = [(normalize_category(category), category, row, qa[0], qa[1], now)
+                for row, qa in enumerate(trivia_questions) if len(qa) == 2 and qa[0] != 0]
+        with self._connect() as connection:
+            connection.executemany("INSERT INTO questions (category, name, row, question, answer, created) VALUES (?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def get_category(self, category):
+        """
+        Picks one banked question per row at random.
+        returns: qa array for the category, or None unless every row is banked
+        """
+        trivia_questions = []
+        with self._connect() as connection:
+            for row in range(self.rows):
+                qa = connection.execute("SELECT question, answer FROM questions WHERE category = ? AND row = ? ORDER BY RANDOM() LIMIT 1",
+                                        (normalize_category(category), row)).fetchone()
+                if qa is None:
+                    return None
+                trivia_questions.append(list(qa))
+        return trivia_questions
+
+    def get_categories(self, categories):
+        """returns: dict of category to qa array for the categories the bank can fully supply"""
+        banked = {}
+        for category in categories:
+            trivia_questions = self.get_category(category)
+            if trivia_questions:
+                banked[category] = trivia_questions
+        return banked
+
+    def summary(self):
+        """returns: list of (category, number of complete question sets)"""
+        with self._connect() as connection:
+            return connection.execute("SELECT name, MIN(count) FROM "
+                                      "(SELECT category, MAX(name) AS name, row, COUNT(*) AS count FROM questions GROUP BY category, row) "
+                                      "GROUP BY category HAVING COUNT(row) = ? ORDER BY name", (self.rows,)).fetchall()
+
+
+def build_bank(categories, bank, sets=1, requests_per_minute=60, tokens_per_minute=90000):
+    """Generates `sets` question sets for every category and stores them in the bank."""
+    limiter = TokenBucketLimiter(requests_per_minute, tokens_per_minute)
+    retry_policy = RetryPolicy()
+    stats = GenerationStats()
+    stored = 0
+    for i in range(sets):
+        for category, trivia_questions in zip(categories, generate_jeopardy_set(categories, limiter=limiter, stats=stats, retry_policy=retry_policy)):
+            if is_complete(trivia_questions):
+                stored += 1
+            bank.add_category(category, trivia_questions)
+    return stored, stats
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pre-generate Chat GeoParT question sets into a local question bank.",
+                                     epilog="OpenAI credentials are read from OPENAI_API_KEY and OPENAI_ORGANIZATION.")
+    parser.add_argument("--bank", default=default_bank_path, help="question bank file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser("build", help="generate question sets for the categories listed in a file, one per line")
+    build_parser.add_argument("categories_file")
+    build_parser.add_argument("--sets", type=int, default=1, help="question sets to generate per category")
+    build_parser.add_argument("--rpm", type=int, default=60, help="API request limit (requests/min)")
+    build_parser.add_argument("--tpm", type=int, default=90000, help="API token limit (tokens/min)")
+    subparsers.add_parser("list", help="show the banked categories")
+    args = parser.parse_args(argv)
+
+    bank = QuestionBank(args.bank)
+    if args.command == "build":
+        with open(args.categories_file, "r") as f:
+            categories = [line.strip() for line in f if line.strip()]
+        timer_start = time.time()
+        stored, stats = build_bank(categories, bank, sets=args.sets, requests_per_minute=args.rpm, tokens_per_minute=args.tpm)
+        for error in stats.errors:
+            print(error, file=sys.stderr)
+        print(f"Stored {stored} complete question sets for {len(categories)} categories "
+              f"in {time.time() - timer_start:.1f}s using {stats.tokens} tokens.")
+    elif args.command == "list":
+        for name, count in bank.summary():
+            print(f"{name}\t{count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,234 @@
+import re
+import sys
+import time
+import zlib
+import random
+import sqlite3
+import hashlib
+import argparse
+import threading
+
+from array import array
+from contextlib import contextmanager
+
+default_index_path = "question_index.sqlite3"
+
+word_pattern = re.compile(r"[a-z0-9]+")
+# Words most clues and answers start with once formatted ('This ...', 'WHAT IS ...?'); they'd make unrelated questions look alike
+filler_words = frozenset(["this", "these", "that", "what", "who", "which", "where", "when", "is", "are", "was", "were", "the", "a", "an", "of", "in"])
+shingle_size = 4
+hash_prime = (1 << 61) - 1
+
+
+def normalize_question(question, answer):
+    """returns: the words of a clue and its answer that matter when comparing them, lowercase and without punctuation"""
+    return " ".join(word for word in word_pattern.findall(f"{question} {answer}".lower()) if word not in filler_words)
+
+def question_digest(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()
+
+def shingles(normalized):
+    """returns: the hashes of every `shingle_size` character run of a normalized question"""
+    if len(normalized) <= shingle_size:
+        return {zlib.crc32(normalized.encode())}
+    return {zlib.crc32(normalized[i:i + shingle_size].encode()) for i in range(len(normalized) - shingle_size + 1)}
+
+
+class QuestionIndex:
+    """
+    Local, persistent index of the questions and answers of generated and saved games, for
+    finding repeats without calling the API. Questions that are the same once case, punctuation
+    and filler words are ignored match by hash; reworded ones match when the MinHash estimate of
+    their character shingles' Jaccard similarity reaches `threshold` and their answers share at
+    least half their words, so clues written from the same template about different things don't
+    match. Candidates are found with locality sensitive hashing, `bands` bands of
+    `num_perm // bands` signature values, so a lookup only compares against a handful of stored
+    questions however large the index grows. Every question is stored with a `source` (a game
+    file or a generated board) and can be removed with it.
+    """
+
+    def __init__(self, path=default_index_path, threshold=0.6, num_perm=64, bands=16, seed=1):
+        self.path = path
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands = bands
+        randomizer = random.Random(seed)
+        self._permutations = [(randomizer.randrange(1, hash_prime), randomizer.randrange(hash_prime)) for i in range(num_perm)]
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS questions ("
+                               "id INTEGER PRIMARY KEY AUTOINCREMENT, digest TEXT NOT NULL, question TEXT NOT NULL, answer TEXT NOT NULL, "
+                               "answer_words TEXT NOT NULL, source TEXT NOT NULL, signature BLOB NOT NULL, created REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS questions_digest ON questions (digest)")
+            connection.execute("CREATE INDEX IF NOT EXISTS questions_source ON questions (source)")
+            connection.execute("CREATE TABLE IF NOT EXISTS bands (band INTEGER NOT NULL, bucket INTEGER NOT NULL, question_id INTEGER NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS bands_bucket ON bands (band, bucket)")
+            connection.execute("CREATE INDEX IF NOT EXISTS bands_question ON bands (question_id)")
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def signature(self, normalized):
+        """returns: the MinHash signature of a normalized question"""
+        hashes = shingles(normalized)
+        return array("Q", [min((a*h + b) % hash_prime for h in hashes) for a, b in self._permutations])
+
+    def _buckets(self, signature):
+        rows = self.num_perm // self.bands
+        return [(band, zlib.crc32(signature[band*rows:(band + 1)*rows].tobytes())) for band in range(self.bands)]
+
+    def fingerprint(self, question, answer):
+        """returns: (digest, signature, answer words) of a question and its answer"""
+        normalized = normalize_question(question, answer)
+        return question_digest(normalized), self.signature(normalized), normalize_question("", answer)
+
+    def similarity(self, signature, other_signature):
+        """returns: the estimated Jaccard similarity of two questions' shingles"""
+        return sum(value == other_value for value, other_value in zip(signature, other_signature)) / self.num_perm
+
+    def likeness(self, fingerprint, other_fingerprint):
+        """returns: how alike two fingerprinted questions are, 0.0 when both have answers and those are different"""
+        digest, signature, answer_words = fingerprint
+        other_digest, other_signature, other_answer_words = other_fingerprint
+        if digest == other_digest:
+            return 1.0
+        answer_words, other_answer_words = set(answer_words.split()), set(other_answer_words.split())
+        if answer_words and other_answer_words and 2*len(answer_words & other_answer_words) < len(answer_words | other_answer_words):
+            return 0.0
+        return self.similarity(signature, other_signature)
+
+    def find(self, question, answer, exclude_source=None, source_prefix="", fingerprint=None):
+        """
+        returns: the most similar stored question as a dict with its question, answer, source and
+        similarity, or None if nothing reaches the threshold. Only questions whose source starts
+        with `source_prefix` and isn't `exclude_source` are considered.
+        """
+        fingerprint = fingerprint or self.fingerprint(question, answer)
+        digest, signature, answer_words = fingerprint
+        buckets = self._buckets(signature)
+        with self._connect() as connection:
+            rows = connection.execute("SELECT question, answer, source, digest, signature, answer_words FROM questions WHERE digest = ? OR id IN "
+                                      "(SELECT question_id FROM bands WHERE " + " OR ".join(["(band = ? AND bucket = ?)"]*len(buckets)) + ")",
+                                      [digest] + [value for bucket in buckets for value in bucket]).fetchall()
+        best = None
+        for stored_question, stored_answer, source, stored_digest, stored_signature, stored_answer_words in rows:
+            if source == exclude_source or not source.startswith(source_prefix):
+                continue
+            similarity = self.likeness(fingerprint, (stored_digest, array("Q", stored_signature), stored_answer_words))
+            if similarity >= self.threshold and (best is None or similarity > best["similarity"]):
+                best = {"question": stored_question, "answer": stored_answer, "source": source, "similarity": similarity}
+        return best
+
+    def _fingerprint_all(self, questions):
+        """returns: (qa, fingerprint) for each [question, answer] pair, skipping empty cells"""
+        return [(qa, self.fingerprint(qa[0], qa[1])) for qa in questions if len(qa) >= 2 and qa[0] != 0]
+
+    def _insert(self, connection, fingerprinted, source, now):
+        for qa, (digest, signature, answer_words) in fingerprinted:
+            cursor = connection.execute("INSERT INTO questions (digest, question, answer, answer_words, source, signature, created) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                                        (digest, qa[0], qa[1], answer_words, source, signature.tobytes(), now))
+            connection.executemany("INSERT INTO bands (band, bucket, question_id) VALUES (?, ?, ?)",
+                                   [(band, bucket, cursor.lastrowid) for band, bucket in self._buckets(signature)])
+        return len(fingerprinted)
+
+    def _delete(self, connection, source):
+        connection.execute("DELETE FROM bands WHERE question_id IN (SELECT id FROM questions WHERE source = ?)", (source,))
+        connection.execute("DELETE FROM questions WHERE source = ?", (source,))
+
+    def add_questions(self, questions, source):
+        """Stores [question, answer] pairs under `source`, skipping empty cells. returns: how many were stored"""
+        fingerprinted = self._fingerprint_all(questions)
+        with self._connect() as connection:
+            return self._insert(connection, fingerprinted, source, time.time())
+
+    def add_board(self, jeopardy_set, source):
+        """Stores every question of a board, one qa array per category, under `source`."""
+        return self.add_questions([qa for column in jeopardy_set for qa in column], source)
+
+    def remove_source(self, source):
+        with self._connect() as connection:
+            self._delete(connection, source)
+
+    def replace_source(self, source, questions):
+        """Stores `questions` as everything `source` holds, e.g. after a game file changed."""
+        return self.replace_sources({source: questions})
+
+    def replace_sources(self, questions_by_source, removed_sources=()):
+        """
+        Like replace_source for every source in `questions_by_source`, and removes `removed_sources`,
+        all in one transaction. returns: how many questions were stored
+        """
+        fingerprinted = {source: self._fingerprint_all(questions) for source, questions in questions_by_source.items()}
+        now = time.time()
+        with self._connect() as connection:
+            for source in set(removed_sources) | set(fingerprinted):
+                self._delete(connection, source)
+            return sum(self._insert(connection, questions, source, now) for source, questions in fingerprinted.items())
+
+    def sources(self):
+        with self._connect() as connection:
+            return {source for source, in connection.execute("SELECT DISTINCT source FROM questions")}
+
+    def board(self):
+        """returns: a BoardDuplicates for checking the questions of one new board"""
+        return BoardDuplicates(self)
+
+    def summary(self):
+        with self._connect() as connection:
+            questions, sources = connection.execute("SELECT COUNT(*), COUNT(DISTINCT source) FROM questions").fetchone()
+        return {"questions": questions, "sources": sources}
+
+
+class BoardDuplicates:
+    """
+    Checks the questions of one board as they are generated, against the index and against the
+    questions already accepted for the same board. Safe to use from several generation threads.
+    """
+
+    def __init__(self, index):
+        self.index = index
+        self._accepted = []
+        self._lock = threading.Lock()
+
+    def accept(self, qa):
+        """returns: False if `qa` repeats a question, otherwise True, and `qa` counts as used from now on"""
+        fingerprint = self.index.fingerprint(qa[0], qa[1])
+        if self.index.find(qa[0], qa[1], fingerprint=fingerprint) is not None:
+            return False
+        with self._lock:
+            if any(self.index.likeness(fingerprint, accepted) >= self.index.threshold for accepted in self._accepted):
+                return False
+            self._accepted.append(fingerprint)
+        return True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Look up questions in the Chat GeoParT repeated-question index.")
+    parser.add_argument("--index", default=default_index_path, help="question index file")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    find_parser = subparsers.add_parser("find", help="show the stored question most like a clue and its answer")
+    find_parser.add_argument("question")
+    find_parser.add_argument("answer", nargs="?", default="")
+    subparsers.add_parser("summary", help="show how many questions are indexed")
+    args = parser.parse_args(argv)
+
+    index = QuestionIndex(args.index)
+    if args.command == "find":
+        timer_start = time.perf_counter()
+        match = index.find(args.question, args.answer)
+        milliseconds = 1000*(time.perf_counter() - timer_start)
+        if match is None:
+            print(f"No repeat found ({milliseconds:.1f} ms).")
+            sys.exit(1)
+        print(f"{100*match['similarity']:.0f}% like '{match['question']}' / '{match['answer']}' in {match['source']} ({milliseconds:.1f} ms).")
+    elif args.command == "summary":
+        summary = index.summary()
+        print(f"{summary['questions']} questions from {summary['sources']} games")
+
+if __name__ == "__main__":
+    main()
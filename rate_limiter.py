@@ -0,0 +1,47 @@
+import time
+import threading
+
+
+class TokenBucketLimiter:
+    """
+    Shared limiter for OpenAI API requests, configured in requests/min and tokens/min.
+    Each call to acquire() blocks until both buckets hold enough capacity for the request.
+    """
+
+    def __init__(self, requests_per_minute, tokens_per_minute):
+        self.requests_per_minute = float(requests_per_minute)
+        self.tokens_per_minute = float(tokens_per_minute)
+        self._request_rate = self.requests_per_minute / 60.0
+        self._token_rate = self.tokens_per_minute / 60.0
+        self._requests = self.requests_per_minute
+        self._tokens = self.tokens_per_minute
+        self._last_refill = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        elapsed = now - self._last_refill
+        self._last_refill = now
+        self._requests = min(self.requests_per_minute, self._requests + elapsed * self._request_rate)
+        self._tokens = min(self.tokens_per_minute, self._tokens + elapsed * self._token_rate)
+
+    def acquire(self, tokens=0):
+        """Blocks until one request and `tokens` tokens are available, then consumes them."""
+        # A request bigger than the whole bucket would otherwise wait forever
+        tokens = min(float(tokens), self.tokens_per_minute)
+        while True:
+            with self._lock:
+                self._refill()
+                if self._requests >= 1 and self._tokens >= tokens:
+                    self._requests -= 1
+                    self._tokens -= tokens
+                    return
+                wait = max((1 - self._requests) / self._request_rate,
+                           (tokens - self._tokens) / self._token_rate)
+            time.sleep(max(wait, 0.01))
+
+    def record_usage(self, estimated_tokens, actual_tokens):
+        """Corrects the token bucket once the real size of a request is known."""
+        with self._lock:
+            self._refill()
+            self._tokens = min(self.tokens_per_minute, self._tokens + estimated_tokens - actual_tokens)
@@ -0,0 +1,93 @@
+import json
+import time
+import random
+import sqlite3
+import hashlib
+
+from contextlib import contextmanager
+
+default_cache_path = "chatgeopart_cache.sqlite3"
+
+
+def normalize_category(category):
+    return " ".join(category.lower().split())
+
+def make_request_key(category, model, temperature, prompt_template, rows=None):
+    """returns: a digest identifying a category request, the same whatever the category's case or spacing"""
+    key_data = [normalize_category(category), model, temperature, prompt_template]
+    if rows is not None:
+        key_data.append(sorted(rows))
+    return hashlib.sha256(json.dumps(key_data).encode()).hexdigest()
+
+
+class ResponseCache:
+    """
+    Disk-backed cache of raw AI replies, shared by every session and process using the same file.
+    Entries expire after `ttl_seconds` and the least recently used ones are evicted once the cache
+    holds more than `max_entries` replies or `max_bytes` of text. With `variants` > 1, a key keeps
+    missing until that many different replies are stored, after which hits pick one at random.
+    """
+
+    def __init__(self, path=default_cache_path, ttl_seconds=7*24*3600, max_entries=5000, max_bytes=50*1024*1024, variants=1):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.variants = variants
+        with self._connect() as connection:
+            connection.execute("CREATE TABLE IF NOT EXISTS responses ("
+                               "id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, response TEXT NOT NULL, "
+                               "size INTEGER NOT NULL, created REAL NOT NULL, last_used REAL NOT NULL)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_key ON responses (key)")
+            connection.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30)
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def get(self, key):
+        """returns: a cached reply for `key`, or None on a miss"""
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("DELETE FROM responses WHERE key = ? AND created < ?", (key, now - self.ttl_seconds))
+            rows = connection.execute("SELECT id, response FROM responses WHERE key = ?", (key,)).fetchall()
+            if len(rows) < max(self.variants, 1):
+                return None
+            entry_id, response = random.choice(rows)
+            connection.execute("UPDATE responses SET last_used = ? WHERE id = ?", (now, entry_id))
+        return response
+
+    def put(self, key, response):
+        now = time.time()
+        with self._connect() as connection:
+            connection.execute("INSERT INTO responses (key, response, size, created, last_used) VALUES (?, ?, ?, ?, ?)",
+                               (key, response, len(response.encode()), now, now))
+            # Keep no more variants than are sampled from
+            connection.execute("DELETE FROM responses WHERE key = ? AND id NOT IN "
+                               "(SELECT id FROM responses WHERE key = ? ORDER BY created DESC LIMIT ?)",
+                               (key, key, max(self.variants, 1)))
+            self._evict(connection, now)
+
+    def _evict(self, connection, now):
+        connection.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl_seconds,))
+        entries, total_bytes = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if entries <= self.max_entries and total_bytes <= self.max_bytes:
+            return
+        # Walk from least to most recently used until both limits are met
+        to_delete = []
+        for entry_id, size in connection.execute("SELECT id, size FROM responses ORDER BY last_used ASC"):
+            if entries <= self.max_entries and total_bytes <= self.max_bytes:
+                break
+            to_delete.append((entry_id,))
+            entries -= 1
+            total_bytes -= size
+        connection.executemany("DELETE FROM responses WHERE id = ?", to_delete)
+
+    def clear(self):
+        with self._connect() as connection:
+            connection.execute("DELETE FROM responses")
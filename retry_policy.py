@@ -0,0 +1,127 @@
+import time
+import random
+import threading
+import functools
+
+from lazy_imports import lazy_module
+
+openai = lazy_module("openai")
+
+
+@functools.lru_cache(maxsize=None)
+def retryable_errors():
+    """
+    returns: the errors worth retrying; anything else (invalid request, bad credentials, ...) fails straight away.
+    Built on first use so importing this module doesn't import openai.
+    """
+    return (
+        openai.error.RateLimitError,
+        openai.error.Timeout,
+        openai.error.APIConnectionError,
+        openai.error.ServiceUnavailableError,
+        openai.error.TryAgain,
+        openai.error.APIError,
+    )
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling the API while the circuit breaker is open."""
+
+    def __init__(self, seconds_left):
+        super().__init__(f"Too many failed OpenAI API requests, pausing requests for {seconds_left:.0f} more seconds.")
+        self.seconds_left = seconds_left
+
+
+class CircuitBreaker:
+    """
+    Stops sending requests after `failure_threshold` consecutive failures. Once `cooldown`
+    seconds have passed a single trial request is let through, and a success closes it again.
+    """
+
+    def __init__(self, failure_threshold=5, cooldown=60.0):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._failures = 0
+        self._opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at is None:
+                return
+            seconds_left = self._opened_at + self.cooldown - time.monotonic()
+            if seconds_left > 0 or self._trial_running:
+                raise CircuitOpenError(max(seconds_left, 0))
+            self._trial_running = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._trial_running = False
+
+    def cancel_trial(self):
+        with self._lock:
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            self._trial_running = False
+            if self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+
+
+def retry_after_seconds(error):
+    """returns: the wait the API asked for through its Retry-After headers, or None"""
+    headers = getattr(error, "headers", None) or {}
+    headers = {str(name).lower(): value for name, value in headers.items()}
+    try:
+        if "retry-after-ms" in headers:
+            return float(headers["retry-after-ms"]) / 1000
+        if "retry-after" in headers:
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        pass
+    return None
+
+
+class RetryPolicy:
+    """
+    Calls the API with exponential backoff and full jitter, waiting for Retry-After instead
+    when the API provides it. Only `retryable_errors()` are retried, and failures feed a circuit breaker.
+    """
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0, breaker=None):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.breaker = breaker if breaker is not None else CircuitBreaker()
+
+    def backoff(self, attempt, error):
+        retry_after = retry_after_seconds(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    def call(self, request, stats=None):
+        """Runs `request()` until it succeeds, fails with a non-retryable error or runs out of attempts."""
+        for attempt in range(self.max_attempts):
+            self.breaker.before_call()
+            try:
+                result = request()
+            except retryable_errors() as e:
+                self.breaker.record_failure()
+                if attempt + 1 >= self.max_attempts:
+                    raise
+                if stats is not None:
+                    stats.add_retry()
+                time.sleep(self.backoff(attempt, e))
+                continue
+            except Exception:
+                # Not the API being unavailable, so it says nothing about the breaker's state
+                self.breaker.cancel_trial()
+                raise
+            self.breaker.record_success()
+            return result
@@ -0,0 +1,149 @@
+import os
+import time
+import hashlib
+import threading
+
+from collections import OrderedDict
+
+default_blob_dir = "session_blobs"
+
+
+class BlobStore:
+    """
+    Process-wide, content-addressed store for the large strings sessions hold (slide markdown,
+    CSS, answer sheets). Identical blobs are kept once however many sessions use them. Blobs
+    not used for `idle_seconds`, and the least recently used ones once more than
+    `max_memory_bytes` are held, are spilled to `directory` and read back when next needed.
+    The directory keeps the most recently used `max_disk_bytes`; older spilled blobs are deleted.
+    """
+
+    def __init__(self, directory=default_blob_dir, max_memory_bytes=64*1024*1024, max_disk_bytes=1024*1024*1024, idle_seconds=15*60):
+        self.directory = directory
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.idle_seconds = idle_seconds
+        self.memory_bytes = 0
+        self.disk_bytes = 0
+        self.spills = 0
+        self.reloads = 0
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        for file_name in os.listdir(directory):
+            self.disk_bytes += os.path.getsize(os.path.join(directory, file_name))
+
+    def _path(self, digest):
+        return os.path.join(self.directory, digest)
+
+    def intern(self, text):
+        """returns: the digest `text` is stored under"""
+        data = text.encode()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                self._memory[digest] = (self._memory[digest][0], time.monotonic())
+            else:
+                self._memory[digest] = (text, time.monotonic())
+                self.memory_bytes += len(data)
+            self._spill()
+        return digest
+
+    def get(self, digest):
+        """returns: the blob stored under `digest`, or None if it was evicted from disk"""
+        with self._lock:
+            if digest in self._memory:
+                self._memory.move_to_end(digest)
+                text = self._memory[digest][0]
+                self._memory[digest] = (text, time.monotonic())
+                return text
+            try:
+                with open(self._path(digest), "rb") as f:
+                    data = f.read()
+            except FileNotFoundError:
+                return None
+            # Reloaded blobs are the most recently used on disk as well
+            os.utime(self._path(digest))
+            text = data.decode()
+            self._memory[digest] = (text, time.monotonic())
+            self.memory_bytes += len(data)
+            self.reloads += 1
+            self._spill()
+            return text
+
+    def size(self, digest):
+        """returns: size in bytes of the blob stored under `digest`, wherever it is"""
+        with self._lock:
+            if digest in self._memory:
+                return len(self._memory[digest][0].encode())
+        try:
+            return os.path.getsize(self._path(digest))
+        except FileNotFoundError:
+            return 0
+
+    def _spill(self):
+        idle_before = time.monotonic() - self.idle_seconds
+        # The most recently used blob always stays in memory
+        while len(self._memory) > 1:
+            digest, (text, last_used) = next(iter(self._memory.items()))
+            if self.memory_bytes <= self.max_memory_bytes and last_used >= idle_before:
+                break
+            del self._memory[digest]
+            data = text.encode()
+            self.memory_bytes -= len(data)
+            self.spills += 1
+            if not os.path.exists(self._path(digest)):
+                temporary_path = self._path(digest) + ".tmp"
+                with open(temporary_path, "wb") as f:
+                    f.write(data)
+                os.replace(temporary_path, self._path(digest))
+                self.disk_bytes += len(data)
+        if self.disk_bytes > self.max_disk_bytes:
+            self._evict_disk()
+
+    def _evict_disk(self):
+        entries = sorted(os.scandir(self.directory), key=lambda entry: entry.stat().st_mtime)
+        for entry in entries:
+            if self.disk_bytes <= self.max_disk_bytes:
+                break
+            size = entry.stat().st_size
+            os.remove(entry.path)
+            self.disk_bytes -= size
+
+    def summary(self):
+        with self._lock:
+            return {
+                "memory_blobs": len(self._memory),
+                "memory_bytes": self.memory_bytes,
+                "disk_bytes": self.disk_bytes,
+                "spills": self.spills,
+                "reloads": self.reloads,
+            }
+
+
+class SessionBlobs:
+    """
+    One session's large strings, held as digests into a shared BlobStore instead of as copies
+    in st.session_state.
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._digests = {}
+
+    def set(self, name, text):
+        self._digests[name] = self.store.intern(text)
+
+    def get(self, name, default=""):
+        """returns: the blob stored as `name`, or `default` if it was never set or is gone from the store"""
+        if name not in self._digests:
+            return default
+        text = self.store.get(self._digests[name])
+        return default if text is None else text
+
+    def __contains__(self, name):
+        return name in self._digests
+
+    def footprint(self):
+        """returns: {name: size in bytes} of every blob this session holds"""
+        return {name: self.store.size(digest) for name, digest in self._digests.items()}
@@ -0,0 +1,58 @@
+import random
+import threading
+
+
+class InFlightCall:
+    """One request in flight. Its leader calls `finish` or `fail`; everyone else `wait`s."""
+
+    def __init__(self, key):
+        self.key = key
+        self.result = None
+        self.failed = False
+        self._done = threading.Event()
+
+    def finish(self, result):
+        self.result = result
+        self._done.set()
+
+    def fail(self):
+        self.failed = True
+        self._done.set()
+
+    def wait(self, timeout=None):
+        """returns: whether the leader finished with a result"""
+        self._done.wait(timeout)
+        return self._done.is_set() and not self.failed
+
+
+class SingleFlight:
+    """
+    Process-wide deduplication of identical requests. The first caller for a key makes the
+    request and every caller that asks for the same key before it finishes shares its result.
+    With `variants` > 1 each caller is put in one of that many slots at random, so up to that
+    many different replies are generated for a key and boards don't all come out identical.
+    If the leader fails, its followers are told to make the request themselves.
+    """
+
+    def __init__(self, variants=1):
+        self.variants = variants
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def join(self, key):
+        """returns: (call, whether this caller is its leader)"""
+        key = (key, random.randrange(self.variants))
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = InFlightCall(key)
+            self._calls[key] = call
+            return call, True
+
+    def leave(self, call):
+        """Called by the leader once its call is finished or failed, so new callers start a fresh request."""
+        with self._lock:
+            if self._calls.get(call.key) is call:
+                del self._calls[call.key]
+
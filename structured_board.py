@@ -0,0 +1,135 @@
+import json
+
+from prompt_context import PromptContext
+from trivia_generator import GenerationStats, query_ai, format_qa_response, is_repeat
+
+board_values = [200, 400, 600, 800, 1000]
+
+# Shape the model is asked to reply with; parse_board_response() checks replies against it cell by cell
+board_schema = {
+    "type": "object",
+    "required": ["categories"],
+    "properties": {
+        "categories": {
+            "type": "array",
+            "items": {
+                "type": "object",
+                "required": ["name", "clues"],
+                "properties": {
+                    "name": {"type": "string"},
+                    "clues": {
+                        "type": "array",
+                        "items": {
+                            "type": "object",
+                            "required": ["value", "question", "answer"],
+                            "properties": {
+                                "value": {"type": "integer"},
+                                "question": {"type": "string"},
+                                "answer": {"type": "string"},
+                            },
+                        },
+                    },
+                },
+            },
+        },
+    },
+}
+
+# A whole board reply is roughly 30 clues of ~50 tokens each
+board_completion_tokens = 2000
+
+
+def board_prompt(categories, values=board_values):
+    amounts = ", ".join(f"'${value}'" for value in values)
+    names = ", ".join(f"'{category}'" for category in categories)
+    return (f"The Jeopardy categories are {names} and the dollar amounts under each category are {amounts} in order of increasing difficulty. "
+            "Generate a jeopardy style question + answer for each dollar amount in every category. "
+            "Reply with a single JSON object that matches this JSON schema, with one entry per category and one clue per dollar amount: "
+            + json.dumps(board_schema))
+
+def repair_prompt(categories, missing_cells, values=board_values):
+    cells_by_category = {}
+    for column, row in missing_cells:
+        cells_by_category.setdefault(categories[column], []).append(f"'${values[row]}'")
+    wanted = "; ".join(f"category '{category}': {', '.join(amounts)}" for category, amounts in cells_by_category.items())
+    return (f"Generate a jeopardy style question + answer for only these Jeopardy categories and dollar amounts: {wanted}. "
+            "Reply with a single JSON object that matches this JSON schema, containing only the requested clues: "
+            + json.dumps(board_schema))
+
+def _strip_code_fence(text):
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.split("\n", 1)[1] if "\n" in text else ""
+        text = text.rsplit("```", 1)[0]
+    return text
+
+def parse_board_response(response, categories, values=board_values):
+    """
+    Validates a JSON board reply and formats every well-formed clue.
+    returns: dict mapping (column, row) to [question, answer]
+    """
+    cells = {}
+    try:
+        data = json.loads(_strip_code_fence(response))
+    except ValueError:
+        return cells
+    if not isinstance(data, dict) or not isinstance(data.get("categories"), list):
+        return cells
+
+    column_by_name = {category.strip().lower(): column for column, category in enumerate(categories)}
+    for entry in data["categories"]:
+        if not isinstance(entry, dict) or not isinstance(entry.get("name"), str) or not isinstance(entry.get("clues"), list):
+            continue
+        column = column_by_name.get(entry["name"].strip().lower())
+        if column is None:
+            continue
+        for clue in entry["clues"]:
+            if not isinstance(clue, dict):
+                continue
+            try:
+                row = values.index(int(str(clue.get("value")).replace("$", "").replace(",", "")))
+            except ValueError:
+                continue
+            question = clue.get("question")
+            answer = clue.get("answer")
+            if not isinstance(question, str) or not isinstance(answer, str) or not question.strip() or not answer.strip():
+                continue
+            cells[(column, row)] = format_qa_response([question.strip(), answer.strip()])
+    return cells
+
+def generate_structured_board(categories, limiter=None, stats=None, context=None, retry_policy=None, client=None, values=board_values, number_of_repairs=2, duplicates=None):
+    """
+    Generates the whole board with a single JSON request, then re-requests only the cells
+    that were missing or malformed, or that repeat an earlier question.
+    returns: list of qa arrays in the same order as `categories`
+    """
+    if stats is None:
+        stats = GenerationStats()
+    if context is None:
+        context = PromptContext(completion_tokens=board_completion_tokens)
+
+    response = query_ai(board_prompt(categories, values), limiter=limiter, stats=stats, context=context,
+                        response_format={"type": "json_object"}, retry_policy=retry_policy, client=client)
+    cells = parse_board_response(response, categories, values) if response else {}
+    if response:
+        stats.add_parse_result(len(cells), len(categories)*len(values) - len(cells))
+    # Repeated questions are kept apart, to fall back on if no new question replaces them
+    repeated = {cell: cells.pop(cell) for cell in [cell for cell in cells if is_repeat(cells[cell], duplicates, stats)]}
+
+    for i in range(number_of_repairs):
+        missing_cells = [(column, row) for column in range(len(categories)) for row in range(len(values)) if (column, row) not in cells]
+        if not missing_cells:
+            break
+        response = query_ai(repair_prompt(categories, missing_cells, values), limiter=limiter, stats=stats, context=context,
+                            response_format={"type": "json_object"}, retry_policy=retry_policy, client=client)
+        if response:
+            repaired = parse_board_response(response, categories, values)
+            repaired_cells = [cell for cell in missing_cells if cell in repaired]
+            for cell in repaired_cells:
+                if is_repeat(repaired[cell], duplicates, stats):
+                    repeated[cell] = repaired[cell]
+                else:
+                    cells[cell] = repaired[cell]
+            stats.add_parse_result(len(repaired_cells), len(missing_cells) - len(repaired_cells))
+
+    return [[cells.get((column, row), repeated.get((column, row), [0])) for row in range(len(values))] for column in range(len(categories))]
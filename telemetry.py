@@ -0,0 +1,117 @@
+import json
+import time
+import threading
+
+from collections import deque
+from prompt_context import model_context_limits, default_context_limit
+
+# USD per 1K prompt tokens and per 1K completion tokens
+model_prices = {
+    "gpt-3.5-turbo": (0.0015, 0.002),
+    "gpt-3.5-turbo-16k": (0.003, 0.004),
+    "gpt-4": (0.03, 0.06),
+    "gpt-4-32k": (0.06, 0.12),
+}
+default_model = "gpt-3.5-turbo"
+
+default_log_path = "telemetry.jsonl"
+default_startup_log_path = "startup.jsonl"
+
+
+def request_cost(model, prompt_tokens, completion_tokens):
+    prompt_price, completion_price = model_prices.get(model, model_prices[default_model])
+    return (prompt_tokens*prompt_price + completion_tokens*completion_price) / 1000
+
+def context_limit(model):
+    return model_context_limits.get(model, default_context_limit)
+
+def make_request_record(model, prompt_tokens, completion_tokens, latency, retries=0, usage_reported=True, error=None):
+    """returns: the telemetry record of one API request, as stored in memory and in the JSONL log"""
+    return {
+        "time": time.time(),
+        "model": model,
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "latency": latency,
+        "retries": retries,
+        "usage_reported": usage_reported,
+        "cost": request_cost(model, prompt_tokens, completion_tokens),
+        "error": error,
+    }
+
+def log_startup(record, log_path=default_startup_log_path):
+    """Appends one process's startup timings to `log_path`, so cold starts can be tracked across deploys."""
+    with open(log_path, "a") as f:
+        f.write(json.dumps(dict(record, time=time.time())) + "\n")
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(fraction * len(sorted_values)))]
+
+
+class Telemetry:
+    """
+    Aggregates request records and parse results, for one session or for the whole process.
+    Totals cover everything recorded; latency percentiles cover the last `max_records` requests.
+    When `log_path` is set every record is also appended to that JSONL file.
+    """
+
+    def __init__(self, log_path=None, max_records=1000):
+        self.log_path = log_path
+        self.records = deque(maxlen=max_records)
+        self.records_bytes = 0
+        self.requests = 0
+        self.errors = 0
+        self.retries = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.cost = 0.0
+        self.parsed_rows = 0
+        self.failed_rows = 0
+        self._lock = threading.Lock()
+
+    def add(self, stats):
+        """Adds everything a GenerationStats collected during one generation."""
+        with self._lock:
+            for record in stats.requests:
+                if len(self.records) == self.records.maxlen:
+                    self.records_bytes -= len(json.dumps(self.records[0]))
+                self.records.append(record)
+                self.records_bytes += len(json.dumps(record))
+                self.requests += 1
+                self.errors += record["error"] is not None
+                self.retries += record["retries"]
+                self.prompt_tokens += record["prompt_tokens"]
+                self.completion_tokens += record["completion_tokens"]
+                self.cost += record["cost"]
+            self.parsed_rows += stats.parsed_rows
+            self.failed_rows += stats.failed_rows
+            if self.log_path and stats.requests:
+                with open(self.log_path, "a") as f:
+                    for record in stats.requests:
+                        f.write(json.dumps(record) + "\n")
+
+    def footprint(self):
+        """returns: about how many bytes the kept records take, measured as JSON"""
+        with self._lock:
+            return self.records_bytes
+
+    def summary(self):
+        with self._lock:
+            records = [record for record in self.records if record["error"] is None]
+            latencies = sorted(record["latency"] for record in records)
+            streamed_tokens = sum(record["completion_tokens"] for record in records)
+            parse_attempts = self.parsed_rows + self.failed_rows
+            return {
+                "requests": self.requests,
+                "errors": self.errors,
+                "retries": self.retries,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "cost": self.cost,
+                "p50_latency": percentile(latencies, 0.50),
+                "p95_latency": percentile(latencies, 0.95),
+                "tokens_per_second": streamed_tokens / sum(latencies) if latencies and sum(latencies) else 0.0,
+                "parse_success_rate": self.parsed_rows / parse_attempts if parse_attempts else 1.0,
+            }
@@ -0,0 +1,32 @@
+from game_format import make_game, patch_game, render_game
+
+categories = [f"Category {column}" for column in range(6)]
+jeopardy_set = [[[f"Question {column}-{row}", f"Answer {column}-{row}"] for row in range(5)] for column in range(6)]
+
+
+def edit_slides(game, old, new):
+    markdown = render_game(game)[0]
+    assert markdown.count(old) == 1
+    return markdown.replace(old, new)
+
+
+def test_question_edit_is_applied_to_the_game():
+    game = make_game(categories, jeopardy_set)
+    patched = patch_game(game, edit_slides(game, "[Question 2-3]", "[What is the tallest mountain?]"))
+    assert patched["clues"][2][3] == ["What is the tallest mountain?", "Answer 2-3"]
+    assert patched["clues"][2][2] == game["clues"][2][2]
+    assert game["clues"][2][3] == ["Question 2-3", "Answer 2-3"]
+
+
+def test_answer_slide_edit_is_applied_to_the_game():
+    game = make_game(categories, jeopardy_set)
+    # The answer shows on the question slide too, so both are edited together
+    markdown = edit_slides(game, "[Answer 4-1]", "[Everest]").replace("Answer:Answer 4-1", "Answer:Everest")
+    patched = patch_game(game, markdown)
+    assert patched["clues"][4][1] == ["Question 4-1", "Everest"]
+    assert render_game(patched)[0] == markdown
+
+
+def test_edit_outside_questions_and_answers_is_not_applied():
+    game = make_game(categories, jeopardy_set)
+    assert patch_game(game, edit_slides(game, "[CATEGORY 5](#/8)", "[MOUNTAINS](#/8)")) is None
@@ -0,0 +1,134 @@
+import time
+import threading
+
+import openai
+import pytest
+
+from retry_policy import CircuitBreaker, CircuitOpenError, RetryPolicy
+from trivia_generator import GenerationStats
+
+
+class FakeRequest:
+    """Stands in for one API request: raises each error in `errors` in turn, then returns `result`."""
+
+    def __init__(self, errors=(), result="reply"):
+        self.errors = list(errors)
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.result
+
+
+def rate_limited(headers=None):
+    return openai.error.RateLimitError("slow down", headers=headers)
+
+
+def test_retryable_errors_are_retried_until_success():
+    stats = GenerationStats()
+    request = FakeRequest([rate_limited(), openai.error.Timeout("timed out")])
+    policy = RetryPolicy(max_attempts=4, base_delay=0)
+    assert policy.call(request, stats) == "reply"
+    assert request.calls == 3
+    assert stats.retries == 2
+
+
+def test_last_error_is_raised_once_attempts_run_out():
+    stats = GenerationStats()
+    request = FakeRequest([rate_limited() for i in range(5)])
+    policy = RetryPolicy(max_attempts=3, base_delay=0)
+    with pytest.raises(openai.error.RateLimitError):
+        policy.call(request, stats)
+    assert request.calls == 3
+    assert stats.retries == 2
+
+
+def test_other_errors_fail_straight_away():
+    request = FakeRequest([openai.error.InvalidRequestError("bad prompt", param=None)])
+    policy = RetryPolicy(max_attempts=4, base_delay=0)
+    with pytest.raises(openai.error.InvalidRequestError):
+        policy.call(request)
+    assert request.calls == 1
+
+
+def test_backoff_waits_for_retry_after():
+    policy = RetryPolicy(base_delay=100, max_delay=30)
+    assert policy.backoff(0, rate_limited({"Retry-After": "2"})) == 2
+    assert policy.backoff(0, rate_limited({"retry-after-ms": "250"})) == 0.25
+    assert policy.backoff(0, rate_limited({"Retry-After": "3600"})) == 30
+    assert 0 <= policy.backoff(5, rate_limited()) <= 30
+
+
+def test_breaker_opens_after_consecutive_failures():
+    policy = RetryPolicy(max_attempts=1, base_delay=0, breaker=CircuitBreaker(failure_threshold=3, cooldown=60))
+    for i in range(3):
+        with pytest.raises(openai.error.RateLimitError):
+            policy.call(FakeRequest([rate_limited()]))
+    request = FakeRequest()
+    with pytest.raises(CircuitOpenError):
+        policy.call(request)
+    assert request.calls == 0
+
+
+def test_success_resets_consecutive_failures():
+    policy = RetryPolicy(max_attempts=1, base_delay=0, breaker=CircuitBreaker(failure_threshold=2, cooldown=60))
+    for i in range(3):
+        with pytest.raises(openai.error.RateLimitError):
+            policy.call(FakeRequest([rate_limited()]))
+        assert policy.call(FakeRequest()) == "reply"
+
+
+def test_breaker_lets_one_trial_through_after_cooldown():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    policy = RetryPolicy(max_attempts=1, base_delay=0, breaker=breaker)
+    with pytest.raises(openai.error.RateLimitError):
+        policy.call(FakeRequest([rate_limited()]))
+    time.sleep(0.06)
+
+    trial_started, finish_trial = threading.Event(), threading.Event()
+    results = []
+
+    def trial():
+        trial_started.set()
+        finish_trial.wait(5)
+        return "trial reply"
+
+    trial_thread = threading.Thread(target=lambda: results.append(policy.call(trial)))
+    trial_thread.start()
+    assert trial_started.wait(5)
+    # While the trial runs every other caller is still turned away
+    request = FakeRequest()
+    with pytest.raises(CircuitOpenError):
+        policy.call(request)
+    assert request.calls == 0
+    finish_trial.set()
+    trial_thread.join(5)
+
+    assert results == ["trial reply"]
+    assert policy.call(FakeRequest()) == "reply"
+
+
+def test_failed_trial_reopens_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    policy = RetryPolicy(max_attempts=1, base_delay=0, breaker=breaker)
+    with pytest.raises(openai.error.RateLimitError):
+        policy.call(FakeRequest([rate_limited()]))
+    time.sleep(0.06)
+    with pytest.raises(openai.error.RateLimitError):
+        policy.call(FakeRequest([rate_limited()]))
+    with pytest.raises(CircuitOpenError):
+        policy.call(FakeRequest())
+
+
+def test_trial_ending_in_other_error_frees_the_breaker():
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=0.05)
+    policy = RetryPolicy(max_attempts=1, base_delay=0, breaker=breaker)
+    with pytest.raises(openai.error.RateLimitError):
+        policy.call(FakeRequest([rate_limited()]))
+    time.sleep(0.06)
+    with pytest.raises(ValueError):
+        policy.call(FakeRequest([ValueError("not the API's fault")]))
+    assert policy.call(FakeRequest()) == "reply"
@@ -0,0 +1,139 @@
+import threading
+
+from types import SimpleNamespace
+
+from single_flight import SingleFlight
+from trivia_generator import GenerationStats, get_jeopardy_trivia, stream_jeopardy_trivia
+
+reply = "\n".join(f"- ${amount} | Question {amount} : Answer {amount}" for amount in (200, 400, 600, 800, 1000))
+
+
+class CountingSingleFlight(SingleFlight):
+    """A SingleFlight that signals every join, so a test knows when its followers are waiting."""
+
+    def __init__(self, expected_joins, variants=1):
+        super().__init__(variants)
+        self.joins = threading.Semaphore(0)
+        self.expected_joins = expected_joins
+
+    def join(self, key):
+        call, leader = super().join(key)
+        self.joins.release()
+        return call, leader
+
+    def wait_for_joins(self):
+        return all(self.joins.acquire(timeout=5) for i in range(self.expected_joins))
+
+
+class FakeClient:
+    """
+    Stands in for the API. The first request blocks until `release` is set and then fails or
+    replies as told; later requests reply straight away.
+    """
+
+    def __init__(self, first_fails):
+        self.first_fails = first_fails
+        self.first_started = threading.Event()
+        self.release = threading.Event()
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def chat_completion(self, **kwargs):
+        with self._lock:
+            self.requests += 1
+            first = self.requests == 1
+        if kwargs.get("stream"):
+            return self.stream(first)
+        if first:
+            self.first_started.set()
+            self.release.wait(5)
+            if self.first_fails:
+                raise RuntimeError("leader's request failed")
+        return SimpleNamespace(usage=None, choices=[SimpleNamespace(message=SimpleNamespace(content=reply))])
+
+    def stream(self, first):
+        """Streams the reply line by line; the first stream fails after two lines when `first_fails` is set."""
+        for number, line in enumerate(reply.split("\n")):
+            if first and number == 2:
+                self.first_started.set()
+                self.release.wait(5)
+                if self.first_fails:
+                    raise RuntimeError("leader's stream broke off")
+            yield SimpleNamespace(choices=[SimpleNamespace(delta={"content": line + "\n"})])
+
+
+def stream_trivia(category, stats, client, single_flight):
+    trivia_questions = [[0]]*5
+    for row, qa in stream_jeopardy_trivia(category, stats=stats, client=client, single_flight=single_flight):
+        trivia_questions[row] = qa
+    return trivia_questions
+
+
+def generate_concurrently(client, single_flight, number_of_callers, categories=None, generate_trivia=get_jeopardy_trivia):
+    """returns: (every caller's trivia, their GenerationStats), with the first caller leading"""
+    categories = categories or ["Ancient Rome"]*number_of_callers
+    results = [None]*number_of_callers
+    stats = [GenerationStats() for i in range(number_of_callers)]
+
+    def generate(caller):
+        results[caller] = generate_trivia(categories[caller], stats=stats[caller], client=client, single_flight=single_flight)
+
+    leader = threading.Thread(target=generate, args=(0,))
+    leader.start()
+    assert client.first_started.wait(5)
+    followers = [threading.Thread(target=generate, args=(caller,)) for caller in range(1, number_of_callers)]
+    for follower in followers:
+        follower.start()
+    assert single_flight.wait_for_joins()
+    client.release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+    return results, stats
+
+
+def test_join_makes_the_first_caller_leader():
+    single_flight = SingleFlight()
+    call, leader = single_flight.join("key")
+    other_call, other_leader = single_flight.join("key")
+    assert leader and not other_leader
+    assert other_call is call
+    single_flight.leave(call)
+    new_call, new_leader = single_flight.join("key")
+    assert new_leader and new_call is not call
+
+
+def test_followers_share_the_leaders_reply():
+    single_flight = CountingSingleFlight(expected_joins=4)
+    client = FakeClient(first_fails=False)
+    results, stats = generate_concurrently(client, single_flight, 4)
+    assert client.requests == 1
+    assert all(trivia == results[0] and len(trivia[4]) == 2 for trivia in results)
+    assert [caller_stats.shared_requests for caller_stats in stats] == [0, 1, 1, 1]
+
+
+def test_categories_differing_only_in_case_and_spacing_share_a_request():
+    single_flight = CountingSingleFlight(expected_joins=3)
+    client = FakeClient(first_fails=False)
+    results, stats = generate_concurrently(client, single_flight, 3, ["Ancient Rome", "ancient rome", " ANCIENT  Rome"])
+    assert client.requests == 1
+    assert [caller_stats.shared_requests for caller_stats in stats] == [0, 1, 1]
+
+
+def test_followers_of_a_failed_leader_make_their_own_request():
+    single_flight = CountingSingleFlight(expected_joins=3)
+    client = FakeClient(first_fails=True)
+    results, stats = generate_concurrently(client, single_flight, 3)
+    assert client.requests == 3
+    assert results[0] == [[0]]*5 and stats[0].errors
+    assert all(len(trivia[4]) == 2 for trivia in results[1:])
+    assert all(caller_stats.shared_requests == 0 for caller_stats in stats)
+
+
+def test_followers_of_a_stream_that_breaks_off_make_their_own_request():
+    single_flight = CountingSingleFlight(expected_joins=3)
+    client = FakeClient(first_fails=True)
+    results, stats = generate_concurrently(client, single_flight, 3, generate_trivia=stream_trivia)
+    assert client.requests == 3
+    assert [len(qa) for qa in results[0]] == [2, 2, 1, 1, 1] and stats[0].errors
+    assert all(len(trivia[4]) == 2 for trivia in results[1:])
+    assert all(caller_stats.shared_requests == 0 for caller_stats in stats)
@@ -0,0 +1,82 @@
+import os
+import sys
+import argparse
+import functools
+
+from lazy_imports import lazy_module
+
+# tiktoken downloads its BPE files on first use unless they're in this cache.
+# Fill it at deploy time with `python tokenizer.py warm`, then copy it to hosts without network access.
+default_cache_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tiktoken_cache")
+os.environ.setdefault("TIKTOKEN_CACHE_DIR", default_cache_dir)
+
+tiktoken = lazy_module("tiktoken")
+
+default_encodings = ["cl100k_base"]
+
+
+class ApproximateEncoding:
+    """Used when a BPE file can neither be found in the cache nor downloaded; counts about 4 characters per token."""
+
+    name = "approximate"
+
+    def encode(self, string):
+        return range((len(string) + 3) // 4)
+
+
+@functools.lru_cache(maxsize=None)
+def get_encoding(encoding_name="cl100k_base"):
+    """Returns the named encoding, loading it only once per process."""
+    try:
+        return tiktoken.get_encoding(encoding_name)
+    except Exception as e:
+        # Offline without a warmed cache: estimates are good enough for rate limiting and budgets
+        print(f"Tokenizer '{encoding_name}' unavailable ({type(e).__name__}), counting tokens approximately. "
+              f"Run `python tokenizer.py warm` where there is network access.", file=sys.stderr)
+        return ApproximateEncoding()
+
+@functools.lru_cache(maxsize=None)
+def get_encoding_for_model(model):
+    """Returns the encoding a model uses, falling back to cl100k_base for unknown models."""
+    try:
+        return get_encoding(tiktoken.encoding_name_for_model(model))
+    except KeyError:
+        return get_encoding()
+
+def num_tokens_from_string(string: str, encoding_name="cl100k_base", model=None) -> int:
+    """Returns the number of tokens in a text string."""
+    encoding = get_encoding_for_model(model) if model else get_encoding(encoding_name)
+    num_tokens = len(encoding.encode(string))
+    return num_tokens
+
+def num_tokens_from_messages(messages, encoding_name="cl100k_base", model=None) -> int:
+    """Returns the number of prompt tokens used by a list of chat messages."""
+    # Every message is wrapped in 3 formatting tokens and the reply is primed with 3 more
+    num_tokens = 3
+    for message in messages:
+        num_tokens += 3 + num_tokens_from_string(message["content"], encoding_name, model)
+    return num_tokens
+
+def warm_cache(encoding_names=default_encodings):
+    """Downloads the BPE files of `encoding_names` into the tokenizer cache. returns: the cache directory"""
+    for encoding_name in encoding_names:
+        tiktoken.get_encoding(encoding_name).encode("warm")
+    return os.environ["TIKTOKEN_CACHE_DIR"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Manage the local tiktoken cache used by Chat GeoParT.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    warm_parser = subparsers.add_parser("warm", help="download the tokenizer files so the app works offline")
+    warm_parser.add_argument("encodings", nargs="*", default=default_encodings)
+    args = parser.parse_args(argv)
+
+    if args.command == "warm":
+        try:
+            cache_dir = warm_cache(args.encodings)
+        except Exception as e:
+            sys.exit(f"Couldn't download the tokenizer files: {e}")
+        print(f"Tokenizer cache ready in {cache_dir}: {', '.join(args.encodings)}")
+
+if __name__ == "__main__":
+    main()
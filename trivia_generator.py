@@ -0,0 +1,433 @@
+import time
+import queue
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from lazy_imports import lazy_module
+from prompt_context import PromptContext, ContextBudgetError
+from retry_policy import CircuitOpenError
+from response_cache import make_request_key
+from telemetry import make_request_record
+from answer_normalizer import parse_trivia_line, parse_trivia_response, format_qa_response
+from tokenizer import num_tokens_from_string, num_tokens_from_messages
+
+openai = lazy_module("openai")
+
+
+class GenerationStats:
+    """
+    Thread-safe record of the tokens used, requests made and errors raised while generating a board.
+    Worker threads can't call into Streamlit, so errors are collected here and shown by the app afterwards.
+    With a `profiler` (see profiler.py), each request's latency is also recorded there as it finishes.
+    """
+
+    def __init__(self, profiler=None):
+        self.profiler = profiler
+        self.tokens = 0
+        self.errors = []
+        self.requests = []
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.retries = 0
+        self.parsed_rows = 0
+        self.failed_rows = 0
+        self.shared_requests = 0
+        self.repeated_rows = 0
+        self._lock = threading.Lock()
+
+    def add_error(self, message):
+        with self._lock:
+            self.errors.append(message)
+
+    def add_cache_hit(self):
+        with self._lock:
+            self.cache_hits += 1
+
+    def add_cache_miss(self):
+        with self._lock:
+            self.cache_misses += 1
+
+    def add_retry(self):
+        with self._lock:
+            self.retries += 1
+
+    def add_request(self, record):
+        with self._lock:
+            self.requests.append(record)
+            self.tokens += record["prompt_tokens"] + record["completion_tokens"]
+        if self.profiler is not None:
+            self.profiler.record("api_request", record["latency"])
+
+    def add_parse_result(self, parsed_rows, failed_rows):
+        with self._lock:
+            self.parsed_rows += parsed_rows
+            self.failed_rows += failed_rows
+
+    def add_shared_request(self):
+        with self._lock:
+            self.shared_requests += 1
+
+    def add_repeated_row(self):
+        with self._lock:
+            self.repeated_rows += 1
+
+
+def api_error_message(e):
+    if isinstance(e, CircuitOpenError):
+        #Circuit breaker is open after repeated failures, requests resume after the cooldown
+        return f"ERROR! {e}"
+    elif isinstance(e, openai.error.Timeout):
+        #Handle timeout error, e.g. retry or log
+        return f"ERROR! OpenAI API request timed out: {e}"
+    elif isinstance(e, openai.error.APIError):
+        #Handle API error, e.g. retry or log
+        return f"ERROR! OpenAI API returned an API Error: {e}"
+    elif isinstance(e, openai.error.APIConnectionError):
+        #Handle connection error, e.g. check network or log
+        return f"ERROR! OpenAI API request failed to connect: {e}"
+    elif isinstance(e, openai.error.InvalidRequestError):
+        #Handle invalid request error, e.g. validate parameters or log
+        return f"ERROR! OpenAI API request was invalid: {e}"
+    elif isinstance(e, openai.error.AuthenticationError):
+        #Handle authentication error, e.g. check credentials or log
+        return f"ERROR! OpenAI API request was not authorized: {e}"
+    elif isinstance(e, openai.error.PermissionError):
+        #Handle permission error, e.g. check scope or log
+        return f"ERROR! OpenAI API request was not permitted: {e}"
+    elif isinstance(e, openai.error.RateLimitError):
+        #Handle rate limit error, e.g. wait or log
+        return f"ERROR! OpenAI API request exceeded rate limit. Please wait a few seconds and try again."
+    else:
+        #Handle other exceptions, e.g. log
+        return f"ERROR! OpenAI API request failed: {e}"
+
+def query_ai(message_text, model="gpt-3.5-turbo", temperature=0.7, limiter=None, stats=None, context=None, response_format=None, retry_policy=None, client=None):
+    if stats is None:
+        stats = GenerationStats()
+    if context is None:
+        context = PromptContext()
+    try:
+        messages = context.build_messages(message_text, model)
+    except ContextBudgetError as e:
+        stats.add_error(f"ERROR! {e}")
+        return ""
+    number_of_tokens = num_tokens_from_messages(messages, model=model)
+    extra_args = {}
+    if response_format:
+        extra_args["response_format"] = response_format
+    attempts = 0
+
+    def request():
+        nonlocal attempts
+        attempts += 1
+        if limiter:
+            limiter.acquire(number_of_tokens + context.completion_tokens)
+        create = client.chat_completion if client else openai.ChatCompletion.create
+        return create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    **extra_args
+                    )
+    timer_start = time.perf_counter()
+    try:
+        output = retry_policy.call(request, stats) if retry_policy else request()
+    except Exception as e:
+        stats.add_request(make_request_record(model, 0, 0, time.perf_counter() - timer_start, max(attempts - 1, 0), usage_reported=False, error=type(e).__name__))
+        stats.add_error(api_error_message(e))
+        return ""
+    latency = time.perf_counter() - timer_start
+
+    # Prefer the usage the API reports over our own estimate
+    usage = getattr(output, "usage", None)
+    if usage:
+        prompt_tokens, response_tokens = usage["prompt_tokens"], usage["completion_tokens"]
+    else:
+        prompt_tokens, response_tokens = number_of_tokens, num_tokens_from_string(output.choices[0].message.content or "", model=model)
+    stats.add_request(make_request_record(model, prompt_tokens, response_tokens, latency, attempts - 1, usage_reported=bool(usage)))
+    if limiter:
+        limiter.record_usage(number_of_tokens + context.completion_tokens, prompt_tokens + response_tokens)
+
+    if output.choices[0].message.content:
+        context.record(message_text, output.choices[0].message.content)
+        return output.choices[0].message.content
+    else:
+        return "Error: No response from AI."
+
+def stream_ai(message_text, model="gpt-3.5-turbo", temperature=0.7, limiter=None, stats=None, context=None, retry_policy=None, client=None):
+    """
+    Same as query_ai, but yields the reply piece by piece while the API is still streaming it.
+    returns: (as the generator's return value) whether the whole reply arrived, False if the
+    request failed, possibly after some pieces were already yielded
+    """
+    if stats is None:
+        stats = GenerationStats()
+    if context is None:
+        context = PromptContext()
+    try:
+        messages = context.build_messages(message_text, model)
+    except ContextBudgetError as e:
+        stats.add_error(f"ERROR! {e}")
+        return False
+    number_of_tokens = num_tokens_from_messages(messages, model=model)
+    attempts = 0
+
+    def request():
+        nonlocal attempts
+        attempts += 1
+        if limiter:
+            limiter.acquire(number_of_tokens + context.completion_tokens)
+        create = client.chat_completion if client else openai.ChatCompletion.create
+        return create(
+                    model=model,
+                    messages=messages,
+                    temperature=temperature,
+                    stream=True,
+                    )
+    reply = ""
+    timer_start = time.perf_counter()
+    try:
+        # Only opening the stream is retried, pieces already yielded can't be taken back
+        for chunk in retry_policy.call(request, stats) if retry_policy else request():
+            piece = chunk.choices[0].delta.get("content") if chunk.choices else None
+            if piece:
+                reply += piece
+                yield piece
+    except Exception as e:
+        stats.add_request(make_request_record(model, 0, 0, time.perf_counter() - timer_start, max(attempts - 1, 0), usage_reported=False, error=type(e).__name__))
+        stats.add_error(api_error_message(e))
+        return False
+
+    # Streamed replies don't report usage, so it is estimated
+    response_tokens = num_tokens_from_string(reply, model=model)
+    stats.add_request(make_request_record(model, number_of_tokens, response_tokens, time.perf_counter() - timer_start, attempts - 1, usage_reported=False))
+    if limiter:
+        limiter.record_usage(number_of_tokens + context.completion_tokens, number_of_tokens + response_tokens)
+    if reply:
+        context.record(message_text, reply)
+    return True
+
+category_prompt_template = "The Jeopardy category is '{category}' and the dollar amounts under this category are '$200', '$400', '$600', '$800', '$1000' in order of increasing difficulty. Generate a jeopardy style question + answer for each dollar amount in the category. Provide a list of the questions each with their corresponding answer in the format '- dollar amount | Question : Answer\n'."
+missing_rows_prompt_template = "The Jeopardy category is '{category}' and the dollar amounts under this category are '$200', '$400', '$600', '$800', '$1000' in order of increasing difficulty. Generate a jeopardy style question + answer for only these dollar amounts: {amounts}. Provide a list of the questions each with their corresponding answer in the format '- dollar amount | Question : Answer\n'."
+row_amounts = ["$200", "$400", "$600", "$800", "$1000"]
+
+def category_prompt(category, rows=None):
+    """returns: the prompt for a whole category, or for only the given rows of it"""
+    if rows is None:
+        return category_prompt_template.format(category=category)
+    return missing_rows_prompt_template.format(category=category, amounts=", ".join(f"'{row_amounts[row]}'" for row in sorted(rows)))
+
+def join_single_flight(single_flight, context, category, model, temperature, rows=None):
+    """returns: (in-flight call, whether this caller leads it), or (None, True) when the request can't be shared"""
+    # Requests carrying a session's own history are never shared
+    if single_flight is None or (context is not None and context.history_window):
+        return None, True
+    return single_flight.join(make_request_key(category, model, temperature, category_prompt_template, rows))
+
+def leave_single_flight(single_flight, call, response):
+    """Publishes a leader's reply to its followers, or tells them to make the request themselves."""
+    if call is None:
+        return
+    if response:
+        call.finish(response)
+    else:
+        call.fail()
+    single_flight.leave(call)
+
+def get_jeopardy_trivia(category, limiter=None, stats=None, context=None, cache=None, retry_policy=None, client=None, rows=None, model="gpt-3.5-turbo", temperature=0.7, single_flight=None):
+    if stats is None:
+        stats = GenerationStats()
+    # Partial requests for missing rows never go through the cache
+    if rows is not None:
+        cache = None
+    if cache:
+        cache_key = make_request_key(category, model, temperature, category_prompt_template)
+        response = cache.get(cache_key)
+        if response is not None:
+            stats.add_cache_hit()
+            return parse_trivia_response(response)
+        stats.add_cache_miss()
+
+    prompt = category_prompt(category, rows)
+    call, leader = join_single_flight(single_flight, context, category, model, temperature, rows)
+    if not leader and call.wait():
+        # The leader has already cached this reply
+        stats.add_shared_request()
+        cache = None
+        response = call.result
+    else:
+        response = ""
+        try:
+            response = query_ai(prompt, model=model, temperature=temperature, limiter=limiter, stats=stats, context=context, retry_policy=retry_policy, client=client)
+        finally:
+            if leader:
+                leave_single_flight(single_flight, call, response)
+    trivia_questions = parse_trivia_response(response)
+    if response:
+        requested_rows = range(5) if rows is None else rows
+        failed_rows = len([row for row in missing_rows(trivia_questions) if row in requested_rows])
+        stats.add_parse_result(len(requested_rows) - failed_rows, failed_rows)
+    if cache and is_complete(trivia_questions):
+        cache.put(cache_key, response)
+    return trivia_questions
+
+def stream_jeopardy_trivia(category, limiter=None, stats=None, context=None, cache=None, retry_policy=None, client=None, rows=None, model="gpt-3.5-turbo", temperature=0.7, single_flight=None):
+    """
+    Generates a category like get_jeopardy_trivia, but yields (row, [question, answer])
+    for each line of the reply as soon as it has arrived. Callers sharing another caller's
+    request get its rows all at once when that reply is complete.
+    """
+    if stats is None:
+        stats = GenerationStats()
+    if rows is not None:
+        cache = None
+    if cache:
+        cache_key = make_request_key(category, model, temperature, category_prompt_template)
+        response = cache.get(cache_key)
+        if response is not None:
+            stats.add_cache_hit()
+            for row, qa in enumerate(parse_trivia_response(response)):
+                if len(qa) == 2:
+                    yield row, qa
+            return
+        stats.add_cache_miss()
+
+    prompt = category_prompt(category, rows)
+    requested_rows = set(range(5) if rows is None else rows)
+    call, leader = join_single_flight(single_flight, context, category, model, temperature, rows)
+    if not leader and call.wait():
+        stats.add_shared_request()
+        trivia_questions = parse_trivia_response(call.result)
+        failed_rows = requested_rows.intersection(missing_rows(trivia_questions))
+        stats.add_parse_result(len(requested_rows - failed_rows), len(failed_rows))
+        for row in sorted(requested_rows - failed_rows):
+            yield row, trivia_questions[row]
+        return
+    if not leader:
+        call = None
+
+    response = ""
+    pending_line = ""
+    parsed_rows = set()
+    completed = False
+    try:
+        pieces = stream_ai(prompt, model=model, temperature=temperature, limiter=limiter, stats=stats, context=context, retry_policy=retry_policy, client=client)
+        while True:
+            try:
+                piece = next(pieces)
+            except StopIteration as end:
+                completed = end.value
+                break
+            response += piece
+            *finished_lines, pending_line = (pending_line + piece).split("\n")
+            for line in finished_lines:
+                parsed_line = parse_trivia_line(line)
+                if parsed_line:
+                    parsed_rows.add(parsed_line[0])
+                    yield parsed_line
+    finally:
+        # A reply cut short by an API error or by the consumer is never shared, its followers request it themselves
+        leave_single_flight(single_flight, call, response if completed else "")
+    # The last line of a reply cut short may be cut off too
+    parsed_line = parse_trivia_line(pending_line) if completed else None
+    if parsed_line:
+        parsed_rows.add(parsed_line[0])
+        yield parsed_line
+    if response:
+        stats.add_parse_result(len(requested_rows & parsed_rows), len(requested_rows - parsed_rows))
+
+    if cache and completed and is_complete(parse_trivia_response(response)):
+        cache.put(cache_key, response)
+
+def is_complete(trivia_questions):
+    for array in trivia_questions:
+        if len(array) < 2 or array[0] == 0:
+            return False
+    return True
+
+def missing_rows(trivia_questions):
+    return [row for row, array in enumerate(trivia_questions) if len(array) < 2 or array[0] == 0]
+
+def is_repeat(qa, duplicates, stats=None):
+    """
+    returns: whether `qa` repeats a question already on the board or in the question index
+    (see question_index.BoardDuplicates); any other question counts as used from now on
+    """
+    if duplicates is None or len(qa) < 2 or qa[0] == 0 or duplicates.accept(qa):
+        return False
+    if stats is not None:
+        stats.add_repeated_row()
+    return True
+
+def retry_get_jeopardy_trivia(category, number_of_tries=2, limiter=None, stats=None, context=None, cache=None, retry_policy=None, client=None, single_flight=None, duplicates=None):
+    """Generates a category, then re-requests only the rows that failed to parse or repeat an earlier question."""
+    trivia_questions = get_jeopardy_trivia(category, limiter=limiter, stats=stats, context=context, cache=cache, retry_policy=retry_policy, client=client, single_flight=single_flight)
+    repeated = [row for row, qa in enumerate(trivia_questions) if is_repeat(qa, duplicates, stats)]
+    for i in range(number_of_tries - 1):
+        rows = sorted(set(missing_rows(trivia_questions) + repeated))
+        if not rows:
+            break
+        repaired = get_jeopardy_trivia(category, limiter=limiter, stats=stats, context=context, retry_policy=retry_policy, client=client, single_flight=single_flight, rows=rows)
+        # A repeated question is only replaced by a new one, never by an empty cell
+        replaced = [row for row in rows if row not in repeated or row not in missing_rows(repaired)]
+        for row in replaced:
+            trivia_questions[row] = repaired[row]
+        repeated = [row for row in repeated if row not in replaced] + [row for row in replaced if is_repeat(trivia_questions[row], duplicates, stats)]
+    return trivia_questions
+
+def generate_jeopardy_set(categories, limiter=None, stats=None, context=None, cache=None, retry_policy=None, client=None, concurrent=True, max_workers=6, single_flight=None, duplicates=None):
+    """
+    Generates the questions for every category, in parallel when `concurrent` is set.
+    returns: list of qa arrays in the same order as `categories`
+    """
+    if not concurrent:
+        return [retry_get_jeopardy_trivia(category, limiter=limiter, stats=stats, context=context, cache=cache, retry_policy=retry_policy, client=client, single_flight=single_flight, duplicates=duplicates) for category in categories]
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(lambda category: retry_get_jeopardy_trivia(category, limiter=limiter, stats=stats, context=context, cache=cache, retry_policy=retry_policy, client=client, single_flight=single_flight, duplicates=duplicates), categories))
+
+def stream_jeopardy_set(categories, limiter=None, stats=None, context=None, cache=None, retry_policy=None, client=None, number_of_tries=2, max_workers=6, single_flight=None, duplicates=None):
+    """
+    Streams every category in parallel and yields (column, row, [question, answer]) as each
+    question is parsed. Only the rows still missing when a category's reply ends are requested again,
+    including rows held back because they repeat an earlier question.
+    """
+    events = queue.Queue()
+
+    def stream_category(column, category):
+        error = None
+        try:
+            rows_left = set(range(5))
+            repeated = {}
+            for i in range(number_of_tries):
+                # The first request asks for the whole category, later ones only for the rows still missing
+                rows = None if i == 0 else rows_left
+                for row, qa in stream_jeopardy_trivia(category, limiter=limiter, stats=stats, context=context, cache=cache, retry_policy=retry_policy, client=client, single_flight=single_flight, rows=rows):
+                    if row in rows_left and is_repeat(qa, duplicates, stats):
+                        repeated[row] = qa
+                    elif row in rows_left:
+                        rows_left.discard(row)
+                        events.put((column, row, qa))
+                if not rows_left:
+                    break
+            # Questions that still repeat after the last try are better than empty cells
+            for row, qa in repeated.items():
+                if row in rows_left:
+                    events.put((column, row, qa))
+        except Exception as e:
+            error = e
+        finally:
+            # A row of None marks the end of a category and carries any error it raised
+            events.put((column, None, error))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for column, category in enumerate(categories):
+            executor.submit(stream_category, column, category)
+        categories_left = len(categories)
+        while categories_left:
+            column, row, qa = events.get()
+            if row is None:
+                categories_left -= 1
+                if qa is not None:
+                    raise qa
+            else:
+                yield column, row, qa